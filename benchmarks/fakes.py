@@ -0,0 +1,148 @@
+"""Local stand-ins for the Spotify and Twitch APIs, serving recorded payloads.
+
+Used by benchmarks/run.py. It can also run on its own, to point a dev server
+at it:
+
+    python benchmarks/fakes.py --port 3901 --latency-ms 40
+"""
+
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+
+PAYLOADS = Path(__file__).resolve().parent / 'payloads'
+
+
+class FakeUpstreams:
+    """One aiohttp app answering both the Spotify and the Twitch endpoints the server calls."""
+
+    def __init__(self, latency=0.0, followers=1000):
+        self.latency = latency
+        self.followers = followers
+        self.spotify = json.loads((PAYLOADS / 'spotify.json').read_text())
+        self.twitch = json.loads((PAYLOADS / 'twitch.json').read_text())
+        self.calls = {}
+        self._runner = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.add_routes([
+            web.post('/spotify/api/token', self._json(self.spotify['token'])),
+            web.get('/spotify/v1/me/player/currently-playing', self._currently_playing),
+            web.post('/twitch/oauth2/token', self._json(self.twitch['token'])),
+            web.get('/twitch/helix/users', self._json(self.twitch['users'])),
+            web.get('/twitch/helix/channels', self._json(self.twitch['channels'])),
+            web.get('/twitch/helix/channels/ads', self._json(self.twitch['ads'])),
+            web.get('/twitch/helix/channels/followers', self._followers)
+        ])
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.calls[request.path] = self.calls.get(request.path, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = await handler(request)
+        if request.path.startswith('/twitch/helix'):
+            # Plenty of points left, so the server's rate limiter never kicks in
+            response.headers['Ratelimit-Limit'] = '800'
+            response.headers['Ratelimit-Remaining'] = '799'
+            response.headers['Ratelimit-Reset'] = str(int(time.time()) + 60)
+        return response
+
+    @staticmethod
+    def _json(payload):
+        body = json.dumps(payload)
+
+        async def handler(request):
+            return web.Response(text=body, content_type='application/json')
+        return handler
+
+    async def _currently_playing(self, request):
+        payload = dict(self.spotify['currently_playing'], timestamp=int(time.time() * 1000))
+        return web.json_response(payload)
+
+    async def _followers(self, request):
+        first = int(request.query.get('first', 20))
+        offset = int(request.query.get('after', 0))
+        newest = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        template = self.twitch['follower']
+
+        data = [
+            dict(
+                template,
+                user_id=str(100000 + index),
+                user_login=f'follower{index}',
+                user_name=f'Follower{index}',
+                followed_at=(newest - timedelta(minutes=index)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            )
+            for index in range(offset, min(offset + first, self.followers))
+        ]
+        pagination = {'cursor': str(offset + first)} if offset + first < self.followers else {}
+        return web.json_response({'total': self.followers, 'data': data, 'pagination': pagination})
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start serving.
+
+        Returns:
+            str: Base URL, such as `http://127.0.0.1:3901`
+        """
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f'http://{host}:{port}'
+
+    async def stop(self):
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def server_env(base):
+    """Environment variables that point the server at the fakes."""
+    return {
+        'SPOTIFY_CLIENT_ID': 'benchmark',
+        'SPOTIFY_CLIENT_SECRET': 'benchmark',
+        'SPOTIFY_REFRESH_TOKEN': 'benchmark',
+        'SPOTIFY_ACCESS_ENDPOINT': f'{base}/spotify/api/token',
+        'SPOTIFY_NOWPLAYING_ENDPOINT': f'{base}/spotify/v1/me/player/currently-playing',
+        'TWITCH_CLIENT_ID': 'benchmark',
+        'TWITCH_CLIENT_SECRET': 'benchmark',
+        'TWITCH_REFRESH_TOKEN': 'benchmark',
+        'TWITCH_ACCESS_ENDPOINT': f'{base}/twitch/oauth2/token',
+        'TWITCH_API_BASE': f'{base}/twitch/helix'
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3901)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--followers', type=int, default=1000)
+    args = parser.parse_args()
+
+    fakes = FakeUpstreams(args.latency_ms / 1000, args.followers)
+    base = await fakes.start(args.host, args.port)
+    print(f'fake upstreams on {base}, server environment:')
+    for name, value in server_env(base).items():
+        print(f'  {name}={value}')
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fakes.stop()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,411 @@
+"""Drive every API route and Socket.IO against a local server and record latency percentiles.
+
+Starts fake Spotify/Twitch upstreams (benchmarks/fakes.py) and the server
+(`socket_app`) pointed at them, seeds a scratch database, then runs each
+scenario at every concurrency level. Results are printed and written to a
+JSON file named after the current commit, so runs can be compared:
+
+    python benchmarks/run.py --uri mongodb://localhost:27017/scrambled_bench
+    python benchmarks/run.py --mongod          # start a throwaway mongod (needs it on PATH)
+    python benchmarks/run.py compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+import aiohttp
+import socketio
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fakes import FakeUpstreams, server_env
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER_DIR = ROOT / 'server'
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+TOKEN = 'benchmark'
+AUTHORS = 50
+SEARCH_WORDS = ['raid', 'spotify', 'coffee', 'emote']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Scenario:
+    """One request shape; `build(i)` returns (method, path, json body) for the i-th request."""
+
+    def __init__(self, name, build, setup=None):
+        self.name = name
+        self.build = build
+        self.setup = setup
+
+
+def get(path):
+    return lambda i: ('GET', path, None)
+
+
+def scenarios(state):
+    """Every route in server/router.py, plus /metrics."""
+
+    def create(i):
+        body = {'author': f'author{i % AUTHORS}', 'source': 'benchmark', 'content': f'{uuid.uuid4().hex} hype raid'}
+        return 'POST', '/api/message', body
+
+    def bulk(i):
+        body = [
+            {'author': f'author{n % AUTHORS}', 'source': 'benchmark', 'content': f'{uuid.uuid4().hex} bulk {n}'}
+            for n in range(50)
+        ]
+        return 'POST', '/api/messages/bulk', body
+
+    def message_id(i):
+        return state['ids'][i % len(state['ids'])]
+
+    async def seed_deletable(db, count):
+        result = await db.messages.insert_many([
+            {'hash': uuid.uuid4().hex, 'author': f'doomed{n}', 'source': 'benchmark', 'content': 'to be deleted'}
+            for n in range(count)
+        ])
+        state['doomed'] = [str(_id) for _id in result.inserted_ids]
+
+    def delete_one(i):
+        return 'DELETE', f"/api/message/{state['doomed'][i]}", None
+
+    async def seed_authors(db, count):
+        run = uuid.uuid4().hex[:8]
+        await db.messages.insert_many([
+            {'hash': uuid.uuid4().hex, 'author': f'gone-{run}-{n}', 'source': 'benchmark', 'content': 'by a departing author'}
+            for n in range(count)
+        ])
+        state['gone'] = [f'gone-{run}-{n}' for n in range(count)]
+
+    def delete_author(i):
+        return 'DELETE', f"/api/messages/{state['gone'][i]}", None
+
+    def request_song(i):
+        # A fresh track every time, repeats would only measure the 409
+        body = {'url': f'https://open.spotify.com/track/{uuid.uuid4().hex[:22]}', 'author': f'author{i % AUTHORS}', 'source': 'benchmark', 'role': ('vip', None)[i % 2]}
+        return 'POST', '/api/request', body
+
+    async def fill_queue(db, count):
+        # The queue lives in the server's memory, so it can only be filled over HTTP
+        state['queued'] = [uuid.uuid4().hex[:22] for _ in range(count)]
+        queue_song = lambda i: ('POST', '/api/request', {'url': f"spotify:track:{state['queued'][i]}", 'author': 'benchmark'})
+        await run_http(state['session'], state['base'], Scenario('fill', queue_song), 10, count)
+
+    def delete_request(i):
+        return 'DELETE', f"/api/request/spotify:{state['queued'][i]}", None
+
+    return [
+        Scenario('GET /api/spotify', get('/api/spotify')),
+        Scenario('GET /api/twitch', get('/api/twitch')),
+        Scenario('GET /api/twitch/ads', get('/api/twitch/ads')),
+        Scenario('GET /api/twitch/followers', get('/api/twitch/followers?limit=100')),
+        Scenario('GET /api/status', get('/api/status')),
+        Scenario('GET /api/messages', get('/api/messages?limit=100')),
+        Scenario('GET /api/messages/stats', get('/api/messages/stats')),
+        Scenario('GET /api/messages/search', lambda i: ('GET', f'/api/messages/search?q={SEARCH_WORDS[i % len(SEARCH_WORDS)]}', None)),
+        Scenario('GET /api/message/{id}', lambda i: ('GET', f'/api/message/{message_id(i)}', None)),
+        Scenario('GET /api/messages/{author}', lambda i: ('GET', f'/api/messages/author{i % AUTHORS}?limit=100', None)),
+        Scenario('POST /api/message', create),
+        Scenario('POST /api/messages/bulk', bulk),
+        Scenario('DELETE /api/message/{id}', delete_one, setup=seed_deletable),
+        Scenario('DELETE /api/messages/{author}', delete_author, setup=seed_authors),
+        Scenario('POST /api/request', request_song),
+        Scenario('GET /api/requests', get('/api/requests?limit=100')),
+        Scenario('POST /api/requests/next', lambda i: ('POST', '/api/requests/next', None), setup=fill_queue),
+        Scenario('DELETE /api/request/{track}', delete_request, setup=fill_queue),
+        Scenario('GET /metrics', get('/metrics'))
+    ]
+
+
+async def seed(db, count):
+    """Fill the scratch database with chat-like messages."""
+    words = 'hype raid clip song queue lurk gg pog spotify overlay music vibe coffee emote night'.split()
+    batch = []
+    for n in range(count):
+        content = ' '.join(words[(n * 7 + k) % len(words)] for k in range(6))
+        batch.append({'hash': f'{n:064x}', 'author': f'author{n % AUTHORS}', 'source': 'twitch' if n % 3 else 'discord', 'content': content})
+        if len(batch) == 5000:
+            await db.messages.insert_many(batch)
+            batch = []
+    if batch:
+        await db.messages.insert_many(batch)
+
+    ids = await db.messages.find({}, {'_id': 1}).limit(1000).to_list(length=1000)
+    return [str(doc['_id']) for doc in ids]
+
+
+async def run_http(session, base, scenario, concurrency, requests):
+    """Send `requests` requests from `concurrency` workers and time each one."""
+    timings = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            method, path, body = scenario.build(index)
+            started = time.perf_counter()
+            try:
+                async with session.request(method, f'{base}{path}', json=body) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, errors, time.perf_counter() - started
+
+
+async def run_socketio(base, concurrency, clients, session):
+    """Connect `clients` clients, `concurrency` at a time, then time one broadcast reaching all of them."""
+    connected = []
+    timings = []
+    errors = 0
+    received = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def connect():
+        nonlocal errors
+        client = socketio.AsyncClient(reconnection=False)
+        client.on('message.created', lambda data: received.append(time.perf_counter()))
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await client.connect(base, transports=['websocket'], wait_timeout=10)
+                await client.emit('messages.subscribe')
+            except Exception:
+                errors += 1
+                return
+            timings.append(time.perf_counter() - started)
+        connected.append(client)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connect() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    # Give the subscribe events a moment to land before broadcasting
+    await asyncio.sleep(0.5)
+    body = {'author': 'broadcast', 'source': 'benchmark', 'content': uuid.uuid4().hex}
+    sent = time.perf_counter()
+    async with session.post(f'{base}/api/message', json=body) as response:
+        await response.read()
+    deadline = time.monotonic() + 10
+    while len(received) < len(connected) and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    deliveries = sorted(moment - sent for moment in received)
+
+    await asyncio.gather(*(client.disconnect() for client in connected), return_exceptions=True)
+    return timings, errors, elapsed, deliveries, len(connected)
+
+
+def summarize(name, concurrency, timings, errors, elapsed, **extra):
+    ordered = sorted(timings)
+    result = {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': len(timings),
+        'errors': errors,
+        'throughput': round(len(timings) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+        **extra
+    }
+    print(
+        f"  {name:34s} c={concurrency:<4d} {result['throughput']:9.1f} req/s   "
+        f"p50 {result['p50_ms']:8.2f}   p95 {result['p95_ms']:8.2f}   p99 {result['p99_ms']:8.2f} ms   errors {errors}"
+    )
+    return result
+
+
+def start_mongod():
+    """Start a throwaway standalone mongod on a free port."""
+    if shutil.which('mongod') is None:
+        raise SystemExit('mongod is not on PATH, pass --uri instead')
+    data = tempfile.mkdtemp(prefix='scrambled-bench-')
+    port = free_port()
+    process = subprocess.Popen(
+        ['mongod', '--dbpath', data, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+        stdout=subprocess.DEVNULL
+    )
+    return process, data, f'mongodb://127.0.0.1:{port}/scrambled_bench'
+
+
+async def wait_until_up(session, base, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with session.get(f'{base}/api/status') as response:
+                if response.status < 500:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError('server did not start')
+
+
+async def benchmark(args):
+    mongod = None
+    if args.mongod:
+        mongod, data_dir, args.uri = start_mongod()
+
+    fakes = FakeUpstreams(args.upstream_latency_ms / 1000, args.followers)
+    upstream_base = await fakes.start()
+
+    client = AsyncIOMotorClient(args.uri)
+    db = client.get_default_database('scrambled_bench')
+    await client.drop_database(db.name)
+    state = {'ids': await seed(db, args.messages)}
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    # Room for every request the song request scenarios queue
+    env = {**os.environ, **server_env(upstream_base), 'DB_URI': args.uri, 'SCRAMBLED': TOKEN, 'REQUEST_QUEUE_SIZE': '1000000'}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:socket_app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL
+    )
+
+    results = []
+    headers = {'Authorization': f'Bearer {TOKEN}'}
+    try:
+        connector = aiohttp.TCPConnector(limit=max(args.concurrency))
+        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+            await wait_until_up(session, base)
+            state['session'], state['base'] = session, base
+            # Let the poller and the follower sync make their first pass
+            await asyncio.sleep(2)
+
+            for scenario in scenarios(state):
+                if args.only and not any(part in scenario.name for part in args.only):
+                    continue
+                for concurrency in args.concurrency:
+                    if scenario.setup is not None:
+                        await scenario.setup(db, args.requests)
+                    # Unmeasured warm-up so caches and connection pools are primed
+                    await run_http(session, base, scenario, concurrency, min(args.requests, concurrency * 2))
+                    if scenario.setup is not None:
+                        await scenario.setup(db, args.requests)
+                    timings, errors, elapsed = await run_http(session, base, scenario, concurrency, args.requests)
+                    results.append(summarize(scenario.name, concurrency, timings, errors, elapsed))
+
+            if not args.only or any(part in 'socket.io' for part in args.only):
+                for concurrency in args.concurrency:
+                    timings, errors, elapsed, deliveries, connected = await run_socketio(base, concurrency, args.clients, session)
+                    results.append(summarize('socket.io connect', concurrency, timings, errors, elapsed))
+                    results.append(summarize(
+                        'socket.io broadcast', concurrency, deliveries, connected - len(deliveries), deliveries[-1] if deliveries else 0,
+                        clients=connected
+                    ))
+    finally:
+        server.terminate()
+        server.wait()
+        await fakes.stop()
+        if not args.keep:
+            await client.drop_database(db.name)
+        client.close()
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait()
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    commit = git_commit()
+    output = Path(args.output) if args.output else RESULTS_DIR / f'{commit}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'messages': args.messages,
+            'clients': args.clients,
+            'upstream_latency_ms': args.upstream_latency_ms
+        },
+        'upstream_calls': fakes.calls,
+        'results': results
+    }, indent=2))
+    print(f'results written to {output}')
+
+
+def compare(before_path, after_path):
+    """Print the change in throughput and p95 for every scenario found in both files."""
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    previous = {(r['scenario'], r['concurrency']): r for r in before['results']}
+
+    print(f"{before['commit']} -> {after['commit']}")
+    for result in after['results']:
+        old = previous.get((result['scenario'], result['concurrency']))
+        if old is None:
+            continue
+        throughput = (result['throughput'] - old['throughput']) / old['throughput'] * 100 if old['throughput'] else 0.0
+        p95 = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0.0
+        print(
+            f"  {result['scenario']:34s} c={result['concurrency']:<4d} throughput {throughput:+7.1f}%   "
+            f"p95 {old['p95_ms']:8.2f} -> {result['p95_ms']:8.2f} ms ({p95:+.1f}%)"
+        )
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        if len(sys.argv) != 4:
+            raise SystemExit('usage: run.py compare BEFORE.json AFTER.json')
+        compare(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', default='mongodb://localhost:27017/scrambled_bench')
+    parser.add_argument('--mongod', action='store_true', help='start a throwaway mongod instead of using --uri')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per scenario and concurrency level')
+    parser.add_argument('--messages', type=int, default=20_000, help='messages seeded before the run')
+    parser.add_argument('--clients', type=int, default=500, help='Socket.IO clients per concurrency level')
+    parser.add_argument('--followers', type=int, default=1000)
+    parser.add_argument('--upstream-latency-ms', type=float, default=0, help='delay added by the fake upstreams')
+    parser.add_argument('--only', nargs='+', help='only run scenarios whose name contains one of these')
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch database')
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Compare text-index search with fetching every message and filtering in Python.
+
+Seeds a scratch database (dropped afterwards unless --keep) and runs both
+approaches for a few keywords. Run from the repository root:
+
+    python benchmarks/search.py --uri mongodb://localhost:27017 --count 1000000
+"""
+
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import TEXT
+
+
+WORDS = (
+    'hype raid clip song queue lurk gg pog lol stream bot discord twitch spotify '
+    'overlay music vibe chat emote sub follow ban mod night morning coffee game'
+).split()
+KEYWORDS = ['raid', 'spotify', 'coffee', 'emote']
+INSERT_BATCH = 10_000
+
+
+async def seed(db, count):
+    """Insert `count` synthetic chat messages."""
+    rng = random.Random(1)
+    for start in range(0, count, INSERT_BATCH):
+        batch = [
+            {
+                'hash': f'{index:064x}',
+                'author': f'user{rng.randrange(5000)}',
+                'source': rng.choice(['twitch', 'discord']),
+                'content': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12)))
+            }
+            for index in range(start, min(start + INSERT_BATCH, count))
+        ]
+        await db.messages.insert_many(batch, ordered=False)
+    await db.messages.create_index([('content', TEXT), ('author', TEXT)], name='content_text', weights={'content': 10, 'author': 2})
+
+
+async def text_search(db, keyword, limit):
+    """What /api/messages/search does: $text, ranked by score, one page."""
+    pipeline = [
+        {'$match': {'$text': {'$search': keyword}}},
+        {'$addFields': {'score': {'$meta': 'textScore'}}},
+        {'$sort': {'score': -1, '_id': 1}},
+        {'$limit': limit + 1},
+        {'$addFields': {'_id': {'$toString': '$_id'}}}
+    ]
+    return await db.messages.aggregate(pipeline).to_list(length=limit + 1)
+
+
+async def fetch_all_then_filter(db, keyword, limit):
+    """What clients had to do before: pull /api/messages and filter locally."""
+    messages = await db.messages.find({}).to_list(length=None)
+    return [msg for msg in messages if keyword in msg['content'].split()][:limit]
+
+
+async def measure(function, db, repeat, limit):
+    timings = []
+    for _ in range(repeat):
+        for keyword in KEYWORDS:
+            started = time.perf_counter()
+            await function(db, keyword, limit)
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summary(timings):
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f'p50 {statistics.median(ordered) * 1000:9.1f} ms   p95 {p95 * 1000:9.1f} ms'
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='scrambled_bench_search')
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--keep', action='store_true', help='keep the seeded database')
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.uri)
+    db = client[args.database]
+
+    try:
+        if await db.messages.estimated_document_count() != args.count:
+            await db.messages.drop()
+            print(f'seeding {args.count} messages...')
+            await seed(db, args.count)
+
+        print(f'{args.count} messages, {len(KEYWORDS)} keywords x {args.repeat} runs')
+        print(f"  text index search        {summary(await measure(text_search, db, args.repeat, args.limit))}")
+        print(f"  fetch all, then filter   {summary(await measure(fetch_all_then_filter, db, 1, args.limit))}")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
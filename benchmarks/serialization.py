@@ -0,0 +1,77 @@
+"""Compare message list serialization before and after the orjson response path.
+
+Run from the repository root:
+
+    python benchmarks/serialization.py --count 100000
+"""
+
+import time
+import argparse
+import statistics
+from bson import ObjectId
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+
+def make_messages(count):
+    """Build message documents shaped like the `messages` collection."""
+    return [
+        {
+            '_id': ObjectId(),
+            'hash': f'{index:064x}',
+            'author': f'user{index % 500}',
+            'source': 'twitch' if index % 3 else 'discord',
+            'content': f'message number {index} with a little bit of chat text'
+        }
+        for index in range(count)
+    ]
+
+
+def before(messages):
+    """Python loop over _id, then jsonable_encoder and the stdlib JSON response."""
+    docs = [dict(msg) for msg in messages]
+    for msg in docs:
+        msg['_id'] = str(msg['_id'])
+    return JSONResponse(jsonable_encoder({'total': len(docs), 'messages': docs})).body
+
+
+def after(messages):
+    """_id already converted by $toString on the server, serialized with orjson."""
+    return Response(orjson.dumps({'count': len(messages), 'messages': messages}), media_type='application/json').body
+
+
+def measure(function, messages, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function(messages)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    messages = make_messages(args.count)
+    # What the aggregation pipeline hands back after $toString
+    projected = [{**msg, '_id': str(msg['_id'])} for msg in messages]
+
+    results = {
+        'before (loop + jsonable_encoder + json)': measure(before, messages, args.repeat),
+        'after ($toString + orjson)': measure(after, projected, args.repeat)
+    }
+
+    print(f'{args.count} documents, best/median of {args.repeat} runs')
+    for label, timings in results.items():
+        print(f'  {label:<42} best {min(timings) * 1000:8.1f} ms   median {statistics.median(timings) * 1000:8.1f} ms')
+
+    speedup = min(results['before (loop + jsonable_encoder + json)']) / min(results['after ($toString + orjson)'])
+    print(f'  speedup x{speedup:.1f}')
+
+
+if __name__ == '__main__':
+    main()
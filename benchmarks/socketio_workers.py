@@ -0,0 +1,159 @@
+"""Measure Socket.IO connection capacity and fan-out with 1, 2 and 4 server workers.
+
+Starts the server with each worker count, opens WebSocket clients in waves
+until a wave's p95 connect time passes --max-connect-ms (or --clients is
+reached), then posts one message and counts how many clients receive it.
+Every client should receive it whichever worker it is connected to. All
+clients run in this one process, so raise `ulimit -n` and keep an eye on
+its CPU: past a point the benchmark, not the server, is the limit.
+
+Needs MongoDB (used for the app and, by default, as the Socket.IO message
+queue). Run from the repository root:
+
+    python benchmarks/socketio_workers.py --uri mongodb://localhost:27017/scrambled_bench_sio
+    python benchmarks/socketio_workers.py --queue redis://localhost:6379/0
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import subprocess
+import aiohttp
+import socketio
+from pathlib import Path
+
+
+SERVER_DIR = Path(__file__).resolve().parent.parent / 'server'
+TOKEN = 'benchmark'
+
+
+async def wait_until_up(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f'{url}/api/status', params={'token': TOKEN}) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError(f'server at {url} did not start')
+
+
+def start_server(args, workers):
+    env = {
+        **os.environ,
+        'DB_URI': args.uri,
+        'SOCKETIO_MESSAGE_QUEUE': args.queue or args.uri,
+        'SCRAMBLED': TOKEN,
+        'PORT': str(args.port),
+        'WEB_CONCURRENCY': str(workers)
+    }
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:socket_app', '--port', str(args.port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=SERVER_DIR, env=env
+    )
+
+
+async def connect_client(url, received):
+    client = socketio.AsyncClient(reconnection=False)
+
+    @client.on('message.created')
+    async def on_created(data):
+        received.append(time.perf_counter())
+
+    started = time.perf_counter()
+    await client.connect(url, transports=['websocket'], wait_timeout=10)
+    await client.emit('messages.subscribe')
+    return client, time.perf_counter() - started
+
+
+async def fill(url, args, received):
+    """Connect clients wave by wave until connect latency degrades."""
+    clients = []
+    failures = 0
+
+    while len(clients) < args.clients:
+        results = await asyncio.gather(
+            *(connect_client(url, received) for _ in range(args.wave)),
+            return_exceptions=True
+        )
+        timings = []
+        for result in results:
+            if isinstance(result, BaseException):
+                failures += 1
+            else:
+                clients.append(result[0])
+                timings.append(result[1])
+
+        ordered = sorted(timings) or [float('inf')]
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        if p95 * 1000 > args.max_connect_ms or failures > len(results) * 0.01:
+            break
+
+    return clients, failures, p95
+
+
+async def fan_out(url, clients, received, timeout=10):
+    """Post one message and wait for every subscribed client to receive it."""
+    received.clear()
+    body = {'token': TOKEN, 'author': 'benchmark', 'source': 'benchmark', 'content': uuid.uuid4().hex}
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f'{url}/api/message', json=body) as response:
+            response.raise_for_status()
+
+    deadline = time.monotonic() + timeout
+    while len(received) < len(clients) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    latest = max(received) - started if received else float('nan')
+    return len(received), latest
+
+
+async def run(args, workers):
+    url = f'http://127.0.0.1:{args.port}'
+    server = start_server(args, workers)
+    clients = []
+    try:
+        await wait_until_up(url)
+        # Let the workers subscribe to the message queue
+        await asyncio.sleep(2)
+
+        received = []
+        clients, failures, p95 = await fill(url, args, received)
+        delivered, latest = await fan_out(url, clients, received)
+        print(
+            f'  {workers} worker(s)   {len(clients):6d} clients   {failures:4d} failed   '
+            f'last wave p95 {p95 * 1000:7.1f} ms   fan-out {delivered}/{len(clients)} in {latest * 1000:7.1f} ms'
+        )
+    finally:
+        await asyncio.gather(*(client.disconnect() for client in clients), return_exceptions=True)
+        server.terminate()
+        server.wait()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uri', default='mongodb://localhost:27017/scrambled_bench_sio')
+    parser.add_argument('--queue', default=None, help='SOCKETIO_MESSAGE_QUEUE, defaults to --uri')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=20_000, help='stop after this many clients')
+    parser.add_argument('--wave', type=int, default=250, help='clients connected concurrently per wave')
+    parser.add_argument('--max-connect-ms', type=float, default=1000)
+    parser.add_argument('--port', type=int, default=3900)
+    args = parser.parse_args()
+
+    print(f'waves of {args.wave} until p95 connect > {args.max_connect_ms:.0f} ms (cap {args.clients})')
+    for workers in args.workers:
+        await run(args, workers)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
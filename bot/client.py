@@ -4,11 +4,16 @@ import os
 import asyncio
 from pathlib import Path
 from dotenv import load_dotenv
+
+# Before the helpers are imported, some of them read settings at import time
+load_dotenv()
+
 import discord
 from discord.ext import commands
+import aiohttp
 from helpers.get_commands import get_commands
-
-load_dotenv()
+from helpers.now_playing import NowPlaying, create_api_session
+from helpers.post_assignment import create_database
 
 # Setup bot with intents
 intents = discord.Intents.default()
@@ -42,9 +47,22 @@ async def load_extensions():
 
 async def main():
     """Main bot startup function."""
-    async with bot:
-        await load_extensions()
-        await bot.start(os.getenv('WUMPUS_TOKEN'))
+    # One pooled HTTP session shared by every command for the bot's lifetime
+    connector = aiohttp.TCPConnector(limit=50, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=30)
+    api_session, api_base = create_api_session()
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10)) as session, api_session:
+        bot.session = session
+        bot.db = create_database()
+        
+        # Now-playing snapshot shared by every /song invocation
+        bot.now_playing = NowPlaying(api_session, api_base)
+        bot.now_playing.start()
+        try:
+            async with bot:
+                await load_extensions()
+                await bot.start(os.getenv('WUMPUS_TOKEN'))
+        finally:
+            await bot.now_playing.stop()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -1,10 +1,63 @@
 """Song command for the bot."""
 
-import os
+import time
+import asyncio
 import discord
 from discord import app_commands
 from discord.ext import commands
-import aiohttp
+
+
+# Give up on a stale snapshot after this long, the interaction is deferred by then
+FETCH_TIMEOUT = 10
+
+
+def format_duration(ms):
+    """Format milliseconds as m:ss."""
+    seconds = max(int(ms // 1000), 0)
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+
+def build_embed(snapshot):
+    """
+    Render a now-playing snapshot into an embed.
+    
+    Args:
+        snapshot: Compact track snapshot from the server
+    
+    Returns:
+        discord.Embed: Embed describing the track, or that nothing is playing
+    """
+    if not snapshot or not snapshot.get('playing'):
+        return discord.Embed(
+            title="song",
+            description="nothing is playing right now.",
+            color=discord.Color.dark_grey()
+        )
+    
+    # The snapshot is a few seconds old, move progress forward while the track plays
+    progress = snapshot.get('progress_ms') or 0
+    if snapshot.get('is_playing'):
+        progress += int(time.time() * 1000) - (snapshot.get('timestamp') or 0)
+    duration = snapshot.get('duration_ms') or 0
+    progress = min(progress, duration) if duration else progress
+    
+    embed = discord.Embed(
+        title=snapshot.get('title') or 'unknown track',
+        url=snapshot.get('url'),
+        description=f"by **{snapshot.get('artist') or 'unknown artist'}**",
+        color=discord.Color.green() if snapshot.get('is_playing') else discord.Color.orange()
+    )
+    if snapshot.get('album'):
+        embed.add_field(name='album', value=snapshot['album'], inline=True)
+    embed.add_field(
+        name='playing' if snapshot.get('is_playing') else 'paused',
+        value=f'{format_duration(progress)} / {format_duration(duration)}',
+        inline=True
+    )
+    if snapshot.get('image'):
+        embed.set_thumbnail(url=snapshot['image'])
+    
+    return embed
 
 
 class SongCommand(commands.Cog):
@@ -19,31 +72,22 @@ class SongCommand(commands.Cog):
     )
     async def song_command(self, interaction: discord.Interaction):
         """Display currently playing song."""
+        now_playing = self.bot.now_playing
+        
+        # Fresh snapshot: answer straight away, no network call
+        if now_playing.is_fresh():
+            await interaction.response.send_message(embed=build_embed(now_playing.snapshot), ephemeral=True)
+            return
+        
+        # Stale: acknowledge within Discord's 3 second window, then follow up
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
-            payload = {
-                'token': os.getenv('SCRAMBLED'),
-                'force': True
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    'http://[::]:3000/api/v1/spotify/now',
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    data = await response.json()
-                    print('!!', data)
-            
-            embed = discord.Embed(
-                title="song",
-                description="see the currently playing song if any to be displayed on stream, if stream.",
-                color=discord.Color.green()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
+            snapshot = await asyncio.wait_for(now_playing.get(), FETCH_TIMEOUT)
+            await interaction.followup.send(embed=build_embed(snapshot), ephemeral=True)
+        
         except Exception as ex:
             print(f'[discord] Error in song command: {ex}')
-            await interaction.response.send_message(
+            await interaction.followup.send(
                 'An error occurred while fetching the song.',
                 ephemeral=True
             )
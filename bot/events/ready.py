@@ -3,6 +3,9 @@
 import os
 import discord
 from discord.ext import commands
+from helpers.command_sync import sync_commands
+from helpers.import_calendar import calendar
+from helpers.post_assignment import AssignmentPoster
 
 
 class ReadyEvent(commands.Cog):
@@ -10,12 +13,21 @@ class ReadyEvent(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.started = False
 
     @commands.Cog.listener()
     async def on_ready(self):
         """Handle bot ready event."""
+        # on_ready fires again after every gateway reconnect, the startup work only runs once it succeeds.
+        # The flag is set up front so a reconnect during the work does not start it twice.
+        if self.started:
+            print('[discord] reconnected')
+            return
+        self.started = True
+        
         try:
-            guild = self.bot.get_guild(int(os.getenv('WUMPUS_GUILD')))
+            guild_id = int(os.getenv('WUMPUS_GUILD')) if os.getenv('WUMPUS_GUILD') else None
+            guild = self.bot.get_guild(guild_id) if guild_id else None
             
             if guild:
                 print(
@@ -25,20 +37,28 @@ class ReadyEvent(commands.Cog):
             else:
                 print(f'[discord] logged in as "{self.bot.user.name}"')
             
-            # Sync slash commands
-            print('[discord] Syncing application commands...')
-            await self.bot.tree.sync()
-            print('[discord] Application commands synced')
+            # WUMPUS_SYNC=guild syncs to WUMPUS_GUILD only, which applies instantly while developing
+            sync_guild = guild_id if os.getenv('WUMPUS_SYNC', 'global').lower() == 'guild' else None
+            force = os.getenv('WUMPUS_FORCE_SYNC', '').lower() in ('1', 'true', 'yes')
+            await sync_commands(self.bot, sync_guild, force=force)
             
-            # TODO: Import calendar and check forum events
-            # print('[discord] checking calendar data')
-            # calendar_data = await calendar()
-            # await check_existing_forum_events(...)
+            if os.getenv('BRIGHTSPACE_CALENDAR_URL'):
+                print('[discord] checking calendar data')
+                importer, events = await calendar(self.bot.session)
+                print(f'[discord] {len(events)} new or changed calendar events')
+                
+                if events and os.getenv('WUMPUS_FORUM_CHANNEL'):
+                    poster = AssignmentPoster(self.bot, self.bot.db)
+                    await poster.prepare()
+                    # Only posted ones are marked, failures come back on the next check
+                    importer.mark_reported(await poster.post(events))
             
             # TODO: Start calendar monitoring daemon
             # await start_calendar_monitor(self.bot)
             
         except Exception as ex:
+            # Retried on the next READY
+            self.started = False
             print(f'[discord] bot unable to start: {ex}')
 
 
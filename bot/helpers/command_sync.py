@@ -0,0 +1,92 @@
+"""Sync application commands only when the command tree has changed."""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+import discord
+
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / '.command-sync.json'
+
+
+def _cache_path():
+    # Read when used, after .env is loaded, and an empty COMMAND_SYNC_CACHE= means the default
+    return Path(os.getenv('COMMAND_SYNC_CACHE') or DEFAULT_CACHE_PATH)
+
+
+def _command_payload(command, tree):
+    # discord.py 2.4 takes the tree, earlier 2.x versions take nothing
+    try:
+        return command.to_dict(tree)
+    except TypeError:
+        return command.to_dict()
+
+
+def fingerprint(tree, guild=None):
+    """
+    Hash the serialized command tree.
+    
+    Args:
+        tree: The bot's app_commands.CommandTree
+        guild: Guild to fingerprint the guild commands of, or None for global
+    
+    Returns:
+        str: sha256 hex digest, stable across restarts
+    """
+    payloads = sorted(
+        (_command_payload(command, tree) for command in tree.get_commands(guild=guild)),
+        key=lambda payload: (payload.get('type', 1), payload['name'])
+    )
+    serialized = json.dumps(payloads, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def _load_cache():
+    try:
+        return json.loads(_cache_path().read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    try:
+        _cache_path().write_text(json.dumps(cache, indent=2))
+    except OSError as ex:
+        print(f'[discord] unable to store command fingerprint: {ex}')
+
+
+async def sync_commands(bot, guild_id=None, force=False):
+    """
+    Sync the command tree if it changed since the last sync.
+    
+    With a guild id the global commands are copied to that guild and synced
+    there, which Discord applies instantly (handy while developing).
+    
+    Args:
+        bot: The bot
+        guild_id: Guild to sync to, or None for a global sync
+        force: Sync even when the fingerprint is unchanged
+    
+    Returns:
+        bool: True if a sync was sent to Discord
+    """
+    guild = discord.Object(id=guild_id) if guild_id else None
+    if guild is not None:
+        bot.tree.copy_global_to(guild=guild)
+    
+    # Fingerprints are per application and scope, so switching bots or modes re-syncs
+    key = f"{bot.application_id}:{guild_id or 'global'}"
+    digest = fingerprint(bot.tree, guild)
+    cache = _load_cache()
+    
+    if not force and cache.get(key) == digest:
+        print(f"[discord] application commands unchanged ({guild_id or 'global'}), skipping sync")
+        return False
+    
+    print(f"[discord] syncing application commands ({guild_id or 'global'})...")
+    synced = await bot.tree.sync(guild=guild)
+    cache[key] = digest
+    _save_cache(cache)
+    print(f'[discord] {len(synced)} application commands synced')
+    return True
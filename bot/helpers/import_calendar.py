@@ -0,0 +1,229 @@
+"""Import the Brightspace calendar, only parsing and reporting what changed."""
+
+import os
+import json
+import asyncio
+import hashlib
+from pathlib import Path
+from datetime import date, datetime, timedelta, timezone
+import aiohttp
+from icalendar import Calendar
+
+
+# Course keys, the env var holding each course's calendar "location", and its forum tag
+COURSES = {
+    'prog': {'location': os.getenv('PROG'), 'tag_id': ''},
+    'webd': {'location': os.getenv('WEBD'), 'tag_id': ''},
+    'netw': {'location': os.getenv('NETW'), 'tag_id': '1432035950397096087'},
+    'osys': {'location': os.getenv('OSYS'), 'tag_id': ''},
+    'dbas': {'location': os.getenv('DBAS'), 'tag_id': ''},
+}
+
+# location -> course key, built once instead of scanning every course per event
+LOCATIONS = {course['location']: key for key, course in COURSES.items() if course['location']}
+
+# Fields that make up an event's content hash. DTSTAMP is left out, Brightspace
+# stamps it with the export time so it changes on every download.
+HASHED_FIELDS = ('summary', 'description', 'location', 'start', 'end', 'url', 'sequence')
+
+DEFAULT_CACHE_PATH = './bot/_tmp/calendar-cache.json'
+
+
+def _as_utc(value):
+    """Normalize an ical date or datetime to an aware UTC datetime."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    return None
+
+
+def _decoded(component, name):
+    value = component.get(name)
+    if value is None:
+        return None
+    if name in ('dtstart', 'dtend'):
+        start = _as_utc(value.dt)
+        return start.isoformat() if start else None
+    return str(value)
+
+
+def content_hash(event):
+    """Hash the fields of a normalized event that matter to its forum post."""
+    payload = json.dumps({field: event.get(field) for field in HASHED_FIELDS}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def parse_events(text):
+    """
+    Parse ICS text into normalized events keyed by UID.
+    
+    Args:
+        text: Raw calendar feed
+    
+    Returns:
+        dict: uid -> event dict with the course it belongs to and its content hash
+    """
+    events = {}
+    for component in Calendar.from_ical(text).walk('VEVENT'):
+        uid = _decoded(component, 'uid')
+        if not uid:
+            continue
+        
+        event = {
+            'uid': uid,
+            'summary': _decoded(component, 'summary'),
+            'description': _decoded(component, 'description'),
+            'location': _decoded(component, 'location'),
+            'start': _decoded(component, 'dtstart'),
+            'end': _decoded(component, 'dtend'),
+            'url': _decoded(component, 'url'),
+            'sequence': _decoded(component, 'sequence'),
+        }
+        event['course'] = LOCATIONS.get(event['location'])
+        event['hash'] = content_hash(event)
+        events[uid] = event
+    return events
+
+
+class CalendarImporter:
+    """
+    Incremental Brightspace calendar import.
+    
+    The feed is fetched with the stored `ETag` / `Last-Modified` validators,
+    so an unchanged calendar costs one 304 and no parsing. A 200 whose body
+    hashes the same as the last one is not parsed either. The cache file
+    keeps the parsed events by UID plus, per UID, the content hash last
+    handed out by `upcoming`, which is how changed events are told apart.
+    """
+
+    def __init__(self, url=None, cache_path=None):
+        self.url = url or (os.getenv('BRIGHTSPACE_CALENDAR_URL', '') + os.getenv('BRIGHTSPACE_TOKEN', ''))
+        self.cache_path = Path(cache_path or os.getenv('BRIGHTSPACE_CACHE_PATH') or DEFAULT_CACHE_PATH)
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            state = json.loads(self.cache_path.read_text(encoding='utf8'))
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault('etag', None)
+        state.setdefault('last_modified', None)
+        state.setdefault('body_hash', None)
+        state.setdefault('events', {})
+        state.setdefault('reported', {})
+        return state
+
+    def save(self):
+        """Write the cache to disk, replacing the old file in one step."""
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.cache_path.with_suffix(self.cache_path.suffix + '.tmp')
+            temporary.write_text(json.dumps(self.state, indent=2), encoding='utf8')
+            temporary.replace(self.cache_path)
+        except OSError as ex:
+            print(f'[discord] error writing calendar cache: {ex}')
+
+    async def refresh(self, session):
+        """
+        Fetch the feed if it changed since the last fetch.
+        
+        Args:
+            session: aiohttp.ClientSession to fetch with
+        
+        Returns:
+            bool: True if the calendar was downloaded and parsed again
+        """
+        headers = {}
+        if self.state['events']:
+            if self.state['etag']:
+                headers['If-None-Match'] = self.state['etag']
+            if self.state['last_modified']:
+                headers['If-Modified-Since'] = self.state['last_modified']
+        
+        async with session.get(self.url, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            if response.status == 304:
+                print('[discord] calendar not modified')
+                return False
+            response.raise_for_status()
+            body = await response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        
+        self.state['etag'] = etag
+        self.state['last_modified'] = last_modified
+        
+        # Servers that ignore the validators still send the same bytes for an unchanged feed
+        body_hash = hashlib.sha256(body).hexdigest()
+        if body_hash == self.state['body_hash'] and self.state['events']:
+            print('[discord] calendar unchanged')
+            self.save()
+            return False
+        
+        events = await asyncio.to_thread(parse_events, body)
+        self.state['body_hash'] = body_hash
+        self.state['events'] = events
+        # Forget what was reported for events that left the feed
+        self.state['reported'] = {
+            uid: digest for uid, digest in self.state['reported'].items() if uid in events
+        }
+        self.save()
+        print(f'[discord] calendar updated, {len(events)} events')
+        return True
+
+    def upcoming(self, days_ahead=30, changed_only=True):
+        """
+        Course events starting within the lookahead window.
+        
+        Args:
+            days_ahead: Size of the window in days
+            changed_only: Only return events that were added or changed since
+                they were last marked as reported
+        
+        Returns:
+            list: Event dicts with `course` and `tag_id`, sorted by start
+        """
+        now = datetime.now(timezone.utc)
+        until = now + timedelta(days=days_ahead)
+        reported = self.state['reported']
+        
+        events = []
+        for uid, event in self.state['events'].items():
+            if not event.get('course') or not event.get('start'):
+                continue
+            if changed_only and reported.get(uid) == event['hash']:
+                continue
+            start = datetime.fromisoformat(event['start'])
+            if now <= start <= until:
+                events.append(dict(event, tag_id=COURSES[event['course']]['tag_id']))
+        
+        events.sort(key=lambda event: event['start'])
+        return events
+
+    def mark_reported(self, events):
+        """
+        Record events as handled so `upcoming` skips them until they change.
+        
+        Args:
+            events: Events returned by `upcoming`
+        """
+        for event in events:
+            self.state['reported'][event['uid']] = event['hash']
+        self.save()
+
+
+async def calendar(session, days_ahead=30, changed_only=True):
+    """
+    Refresh the calendar and return the upcoming course events.
+    
+    Args:
+        session: aiohttp.ClientSession to fetch with
+        days_ahead: Size of the lookahead window in days
+        changed_only: Only return added or changed events
+    
+    Returns:
+        tuple: The CalendarImporter (to mark events reported) and the events
+    """
+    importer = CalendarImporter()
+    await importer.refresh(session)
+    return importer, importer.upcoming(days_ahead, changed_only)
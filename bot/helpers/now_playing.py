@@ -0,0 +1,127 @@
+"""Shared now-playing snapshot for the bot, kept fresh by a background task."""
+
+import os
+import time
+import asyncio
+import aiohttp
+
+
+# Seconds between background refreshes, and how old a snapshot may be before commands wait for a new one
+REFRESH_INTERVAL = 5
+SNAPSHOT_TTL = 15
+ERROR_INTERVAL = 30
+
+
+def create_api_session():
+    """
+    Open a session for the Scrambled API.
+    
+    When `SCRAMBLED_API_SOCKET` is set the server is reached over that Unix
+    domain socket (same host, no TCP loopback), otherwise over
+    `SCRAMBLED_API_URL` (default `http://127.0.0.1:3000`).
+    
+    Returns:
+        tuple: aiohttp.ClientSession and the base URL to use with it
+    """
+    socket_path = os.getenv('SCRAMBLED_API_SOCKET')
+    if socket_path:
+        connector = aiohttp.UnixConnector(path=socket_path)
+        # The host part is ignored by the connector, it only ends up in the Host header
+        base_url = 'http://localhost'
+    else:
+        connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=30)
+        base_url = (os.getenv('SCRAMBLED_API_URL') or 'http://127.0.0.1:3000').rstrip('/')
+    
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=5),
+        headers={'Authorization': f"Bearer {os.getenv('SCRAMBLED')}"}
+    )
+    return session, base_url
+
+
+class NowPlaying:
+    """
+    Keep the latest compact track snapshot from `/api/spotify`.
+    
+    A background task refreshes it every REFRESH_INTERVAL seconds. Commands
+    read `snapshot` directly while it is fresh, and otherwise await `get`,
+    which shares one in-flight request between all callers.
+    """
+
+    def __init__(self, session, base_url, refresh_interval=REFRESH_INTERVAL, ttl=SNAPSHOT_TTL):
+        self.session = session
+        self.base_url = base_url
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self.snapshot = None
+        self.fetched_at = 0.0
+        self._task = None
+        self._inflight = None
+
+    def is_fresh(self):
+        """Return True while the snapshot is younger than the TTL."""
+        return self.snapshot is not None and time.monotonic() - self.fetched_at < self.ttl
+
+    async def get(self):
+        """
+        Get a fresh snapshot, fetching one if the cached one is too old.
+        
+        Returns:
+            dict: Compact track snapshot (`playing` is False when idle)
+        """
+        if self.is_fresh():
+            return self.snapshot
+        return await self.refresh()
+
+    async def refresh(self):
+        """
+        Fetch the snapshot, joining an in-flight fetch if there is one.
+        
+        Returns:
+            dict: Compact track snapshot
+        """
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, task):
+        self._inflight = None
+
+    async def _fetch(self):
+        async with self.session.get(f'{self.base_url}/api/spotify', params={'format': 'compact'}) as response:
+            response.raise_for_status()
+            snapshot = await response.json()
+        
+        self.snapshot = snapshot
+        self.fetched_at = time.monotonic()
+        return snapshot
+
+    def start(self):
+        """Start the background refresh loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background refresh loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+                delay = self.refresh_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                # Keep serving the last snapshot until it goes stale
+                print(f'[discord] now playing refresh failed: {ex}')
+                delay = ERROR_INTERVAL
+            await asyncio.sleep(delay)
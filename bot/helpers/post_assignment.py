@@ -0,0 +1,262 @@
+"""Post calendar assignments to the forum channel, concurrently and resumably."""
+
+import os
+import asyncio
+from datetime import datetime, timezone
+import discord
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorClient
+
+
+# Threads created in parallel (ASSIGNMENT_POST_WORKERS). Creations in one forum share a Discord
+# rate-limit bucket, which discord.py waits on, so a couple of workers is enough to keep it busy.
+WORKERS = 2
+# Posted results are written with one bulk_write per this many threads
+RESULT_BATCH_SIZE = 20
+# Attempts per thread when Discord still answers 429 or a 5xx
+MAX_ATTEMPTS = 3
+
+PENDING = 'pending'
+POSTED = 'posted'
+
+# Closes every starter message, so an interrupted run can tell which thread belongs to which assignment
+UID_MARKER = '-# uid: {uid}'
+
+
+def create_database():
+    """
+    Connect the bot to MongoDB.
+    
+    Returns:
+        AsyncIOMotorDatabase: Database from `DB_URI`, `scrambled` if the URI names none
+    """
+    client = AsyncIOMotorClient(os.getenv('DB_URI'))
+    return client.get_default_database('scrambled')
+
+
+def format_assignment(assignment):
+    """
+    Build the thread title and starter message for an assignment.
+    
+    Args:
+        assignment: Event from the calendar importer
+    
+    Returns:
+        tuple: Thread name and message content
+    """
+    due = datetime.fromisoformat(assignment['start'])
+    lines = [
+        f"**Due Date:** {due.strftime('%A, %B %d, %Y %I:%M %p')} UTC",
+        f"**Course:** {assignment['course'].upper()}",
+    ]
+    if assignment.get('description'):
+        lines.append(f"\n**Description:**\n{assignment['description']}")
+    if assignment.get('url'):
+        lines.append(f"\n**Link:** {assignment['url']}")
+    
+    # Thread names are capped at 100 characters, starter messages at 2000 (the marker must survive)
+    marker = UID_MARKER.format(uid=assignment['uid'])
+    name = (assignment.get('summary') or 'New Assignment')[:100]
+    body = '\n'.join(lines)[:2000 - len(marker) - 2]
+    return name, f'{body}\n\n{marker}'
+
+
+class AssignmentPoster:
+    """
+    Forum posting pipeline for calendar assignments.
+    
+    Every candidate UID is checked against the `assignments` collection in one
+    `$in` query. New assignments are recorded as pending with one bulk upsert,
+    then a bounded pool of workers creates their threads. Each success is
+    recorded as posted, batched into bulk upserts.
+    
+    If the bot stops partway through, the next run finds the pending records
+    and first looks for the bot-owned thread whose starter message ends with
+    the assignment's UID marker. Threads that were created but never
+    recorded are adopted instead of being posted twice.
+    """
+
+    def __init__(self, bot, db, channel_id=None, workers=None):
+        self.bot = bot
+        self.collection = db['assignments']
+        self.channel_id = int(channel_id or os.getenv('WUMPUS_FORUM_CHANNEL'))
+        # Read here rather than at import, .env may not be loaded yet then
+        self.workers = workers or int(os.getenv('ASSIGNMENT_POST_WORKERS') or WORKERS)
+        self._results = []
+        self._results_lock = asyncio.Lock()
+
+    async def prepare(self):
+        """Create the unique UID index the upserts rely on."""
+        await self.collection.create_index('uid', unique=True)
+
+    async def _forum(self):
+        forum = self.bot.get_channel(self.channel_id) or await self.bot.fetch_channel(self.channel_id)
+        if not isinstance(forum, discord.ForumChannel):
+            raise ValueError(f'channel {self.channel_id} is not a forum channel')
+        return forum
+
+    async def post(self, assignments):
+        """
+        Post every assignment that has no thread yet.
+        
+        Args:
+            assignments: Events from the calendar importer
+        
+        Returns:
+            list: The assignments that are now posted, including ones posted
+                before. Failed ones are left out so they are retried.
+        """
+        if not assignments:
+            return []
+        
+        by_uid = {assignment['uid']: assignment for assignment in assignments}
+        records = {
+            record['uid']: record
+            async for record in self.collection.find(
+                {'uid': {'$in': list(by_uid)}},
+                {'uid': 1, 'state': 1, 'threadId': 1}
+            )
+        }
+        
+        # Records without a state were written by the old posting code, which only saved posted threads
+        done = [by_uid[uid] for uid, record in records.items() if record.get('state', POSTED) == POSTED]
+        pending = [by_uid[uid] for uid, record in records.items() if record.get('state') == PENDING]
+        new = [assignment for uid, assignment in by_uid.items() if uid not in records]
+        
+        if not pending and not new:
+            return done
+        
+        forum = await self._forum()
+        
+        if new:
+            now = datetime.now(timezone.utc)
+            await self.collection.bulk_write([
+                UpdateOne(
+                    {'uid': assignment['uid']},
+                    {'$setOnInsert': {
+                        'uid': assignment['uid'],
+                        'courseKey': assignment['course'],
+                        'title': assignment.get('summary') or 'New Assignment',
+                        'dueDate': datetime.fromisoformat(assignment['start']),
+                        'state': PENDING,
+                        'createdAt': now,
+                    }},
+                    upsert=True
+                )
+                for assignment in new
+            ], ordered=False)
+        
+        # Left pending by an interrupted run: the thread may already exist
+        adopted = []
+        if pending:
+            adopted, pending = await self._adopt(forum, pending)
+        
+        queue = asyncio.Queue()
+        for assignment in pending + new:
+            queue.put_nowait(assignment)
+        
+        posted = []
+        workers = [
+            asyncio.create_task(self._worker(forum, queue, posted))
+            for _ in range(min(self.workers, queue.qsize()))
+        ]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self._flush()
+        
+        print(f'[discord] posted {len(posted)} of {len(pending) + len(new)} new assignments')
+        return done + adopted + posted
+
+    async def _adopt(self, forum, pending):
+        """Record pending assignments whose thread already exists, split them from the rest."""
+        # Several courses may share a title ("Lab 1"), names only narrow down the candidates
+        threads = {}
+        for thread in forum.threads:
+            if thread.owner_id == self.bot.user.id:
+                threads.setdefault(thread.name, []).append(thread)
+        try:
+            async for thread in forum.archived_threads(limit=100):
+                if thread.owner_id == self.bot.user.id:
+                    threads.setdefault(thread.name, []).append(thread)
+        except discord.HTTPException as ex:
+            print(f'[discord] unable to list archived forum threads: {ex}')
+        
+        adopted, remaining = [], []
+        for assignment in pending:
+            name, _ = format_assignment(assignment)
+            marker = UID_MARKER.format(uid=assignment['uid'])
+            thread = None
+            for candidate in threads.get(name, []):
+                if await self._starter_contains(candidate, marker):
+                    thread = candidate
+                    break
+            if thread is None:
+                remaining.append(assignment)
+            else:
+                await self._record(assignment, thread)
+                adopted.append(assignment)
+        await self._flush()
+        return adopted, remaining
+
+    async def _starter_contains(self, thread, marker):
+        # A forum post's starter message shares the thread's id
+        try:
+            starter = thread.starter_message or await thread.fetch_message(thread.id)
+        except discord.HTTPException:
+            return False
+        return starter.content.rstrip().endswith(marker)
+
+    async def _worker(self, forum, queue, posted):
+        while True:
+            assignment = await queue.get()
+            try:
+                thread = await self._create(forum, assignment)
+                await self._record(assignment, thread)
+                posted.append(assignment)
+                print(f"[discord] posted assignment: {assignment.get('summary')} in course {assignment['course']}")
+            except Exception as ex:
+                # Stays pending, the next run retries it
+                print(f"[discord] error posting assignment {assignment['uid']}: {ex}")
+            finally:
+                queue.task_done()
+
+    async def _create(self, forum, assignment):
+        name, content = format_assignment(assignment)
+        tags = [tag for tag in forum.available_tags if str(tag.id) == assignment.get('tag_id')]
+        
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                created = await forum.create_thread(name=name, content=content, applied_tags=tags)
+                return created.thread
+            except discord.HTTPException as ex:
+                # discord.py already waits out bucket limits, this covers global limits and outages
+                if attempt == MAX_ATTEMPTS or (ex.status != 429 and ex.status < 500):
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def _record(self, assignment, thread):
+        async with self._results_lock:
+            self._results.append(UpdateOne(
+                {'uid': assignment['uid']},
+                {'$set': {
+                    'state': POSTED,
+                    'threadId': str(thread.id),
+                    'postedAt': datetime.now(timezone.utc),
+                }}
+            ))
+            if len(self._results) >= RESULT_BATCH_SIZE:
+                await self._flush_locked()
+
+    async def _flush(self):
+        async with self._results_lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self):
+        if not self._results:
+            return
+        results, self._results = self._results, []
+        await self.collection.bulk_write(results, ordered=False)
@@ -1,33 +1,142 @@
 """FastAPI server application for Scrambled."""
 
-import os
 from pathlib import Path
-from dotenv import load_dotenv
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from settings import get_settings
 from router import router as api_router
+from controllers.session import open_session, close_session
+from controllers.pubsub import create_client_manager
+from controllers.leader import LeaderLease
+from controllers.metrics import MetricsMiddleware, LoopLagMonitor, get_metrics, socketio_clients, include_router
+from controllers.tokens import validate_token, spotify_tokens, twitch_tokens
+from controllers.database.indexes import ensure_indexes, report_query_plans, MissingIndexError
+from controllers.database import stats
+from controllers.database.writebehind import MessageWriteBuffer, WRITE_BEHIND
+from controllers.database.request import RequestQueue
+from controllers.database.dedupe import MessageDedupe
+from daemons.current_spotify_track import SpotifyPoller
+from daemons.follower_sync import FollowerSync
+from daemons.message_feed import MessageFeed, ROOM as MESSAGE_ROOM, author_room
+
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown."""
+    app.state.session = await open_session()
+    
+    # Make sure the hot message queries are indexed and the counters exist before serving them
+    try:
+        app.state.index_problems = await ensure_indexes(app.state.db)
+        await report_query_plans(app.state.db)
+        await stats.seed(app.state.db)
+    except MissingIndexError as error:
+        # Serving without the unique hash index would store every duplicate, refuse to start
+        print(f'[fastapi] required index missing: {error}')
+        await close_session()
+        raise
+    except Exception as error:
+        print(f'[fastapi] unable to prepare database: {error}')
+    
+    await app.state.message_feed.prepare()
+    
+    # Song requests are queued in this process, restore what the last run left
+    if app.state.request_queue is not None:
+        try:
+            await app.state.request_queue.load()
+        except Exception as error:
+            print(f'[fastapi] unable to restore song requests: {error}')
+        app.state.request_queue.start()
+    else:
+        print('[fastapi] song requests are disabled, the queue needs a single worker')
+    app.state.loop_lag.start()
+    
+    if WRITE_BEHIND:
+        # Only write-behind acts on NEW/MAYBE, plain inserts leave duplicates to the unique index
+        app.state.message_dedupe.start()
+        app.state.message_buffer = MessageWriteBuffer(
+            app.state.db,
+            on_written=app.state.message_feed.publish_created,
+            dedupe=app.state.message_dedupe
+        )
+        app.state.message_buffer.start()
+    
+    # With several workers only the lease holder runs the daemons
+    if app.state.leader is None:
+        await start_daemons()
+    else:
+        app.state.leader.start()
+    try:
+        yield
+    finally:
+        # Drain buffered messages before the database client goes away
+        if app.state.message_buffer is not None:
+            await app.state.message_buffer.stop()
+        if app.state.request_queue is not None:
+            await app.state.request_queue.stop()
+        await app.state.message_dedupe.stop()
+        if app.state.leader is None:
+            await stop_daemons()
+        else:
+            await app.state.leader.stop()
+        await app.state.loop_lag.stop()
+        spotify_tokens.close()
+        twitch_tokens.close()
+        await close_session()
+
+
+async def start_daemons():
+    """Start the daemons that must only run once per deployment."""
+    app.state.message_feed.start()
+    app.state.spotify_poller.start()
+    app.state.follower_sync.start()
+
+
+async def stop_daemons():
+    """Stop the daemons started by `start_daemons`."""
+    await app.state.message_feed.stop()
+    await app.state.follower_sync.stop()
+    await app.state.spotify_poller.stop()
 
-load_dotenv()
 
 # Create FastAPI app
-app = FastAPI(title="Scrambled API", version="0.1.2")
+app = FastAPI(title="Scrambled API", version="0.1.2", lifespan=lifespan)
 
-# Create Socket.IO server
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+# Create Socket.IO server, fanned out through a message queue when several workers serve it
+client_manager = create_client_manager()
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', client_manager=client_manager)
 socket_app = socketio.ASGIApp(sio, app)
 
 # MongoDB connection
-mongo_client = AsyncIOMotorClient(os.getenv('DB_URI'))
+mongo_client = AsyncIOMotorClient(settings.db_uri)
 db = mongo_client.get_database()
 
-# Store database in app state
+# Store settings and database in app state
+app.state.settings = settings
 app.state.db = db
 app.state.sio = sio
+app.state.spotify_poller = SpotifyPoller(sio, db if client_manager is not None else None)
+app.state.follower_sync = FollowerSync(db)
+app.state.message_feed = MessageFeed(db, sio)
+app.state.message_buffer = None
+# Another worker's delete does not reach this worker's LRU, so with several workers its hits are checked
+app.state.message_dedupe = MessageDedupe(db, trust_recent=client_manager is None)
+# The queue lives in memory, several workers would each serve a different one
+app.state.request_queue = RequestQueue(db, sio) if client_manager is None else None
+app.state.leader = LeaderLease(db, 'daemons', start_daemons, stop_daemons) if client_manager is not None else None
+app.state.loop_lag = LoopLagMonitor()
+app.state.index_problems = []
+
+# Request count and latency per route template
+app.add_middleware(MetricsMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -55,8 +164,11 @@ async def socketio_js():
     # Socket.IO client would be served from CDN or custom location
     raise HTTPException(status_code=404, detail="Use Socket.IO CDN")
 
+# Prometheus scrape endpoint, send the API token as `Authorization: Bearer`
+app.add_api_route('/metrics', get_metrics, methods=['GET'], include_in_schema=False, dependencies=[Depends(validate_token)])
+
 # API routes
-app.include_router(api_router, prefix='/api')
+include_router(app, api_router, '/api')
 
 # 404 handler
 @app.exception_handler(404)
@@ -75,11 +187,34 @@ async def general_exception_handler(request: Request, exc: Exception):
 async def connect(sid, environ):
     """Handle client connection."""
     print(f'[fastapi] >> [socket.io] A new client connection occurred: {sid}')
+    socketio_clients.inc()
+    
+    # Bring the new client up to date, later changes are pushed by the poller
+    snapshot = await app.state.spotify_poller.current()
+    if snapshot is not None:
+        await sio.emit('spotify.track-changed', snapshot, to=sid)
+    
+    queue = app.state.request_queue
+    if queue is not None and len(queue):
+        await sio.emit('requests.updated', {'total': len(queue), 'requests': queue.peek(queue.overlay_size)}, to=sid)
 
 @sio.event
 async def disconnect(sid):
     """Handle client disconnection."""
     print(f'[fastapi] >> [socket.io] Client disconnected: {sid}')
+    socketio_clients.dec()
+
+@sio.on('messages.subscribe')
+async def handle_messages_subscribe(sid, data=None):
+    """Join the live message feed, optionally for a single author."""
+    author = (data or {}).get('author')
+    await sio.enter_room(sid, author_room(author) if author else MESSAGE_ROOM)
+
+@sio.on('messages.unsubscribe')
+async def handle_messages_unsubscribe(sid, data=None):
+    """Leave the live message feed."""
+    author = (data or {}).get('author')
+    await sio.leave_room(sid, author_room(author) if author else MESSAGE_ROOM)
 
 @sio.on('scrambled-stage.spotify-pong')
 async def handle_spotify_pong(sid, data):
@@ -89,15 +224,25 @@ async def handle_spotify_pong(sid, data):
 if __name__ == '__main__':
     import uvicorn
     
-    host = os.getenv('HOST', '0.0.0.0')
-    port = int(os.getenv('PORT', 3000))
+    host = settings.host
+    port = settings.port
+    workers = settings.workers
+    
+    if workers > 1 and client_manager is None:
+        raise SystemExit('[fastapi] WEB_CONCURRENCY > 1 needs SOCKETIO_MESSAGE_QUEUE, see README_PYTHON.md')
     
-    print(f'[fastapi] Available at http://{host}:{port}')
+    # A co-located bot (and a reverse proxy) can reach the server over a Unix socket instead of TCP
+    if settings.api_socket:
+        bind = {'uds': settings.api_socket}
+        print(f'[fastapi] Available at unix:{settings.api_socket}')
+    else:
+        bind = {'host': host, 'port': port}
+        print(f'[fastapi] Available at http://{host}:{port}')
     
-    # Start server
+    # Start server, workers need an import string so each process can load the app
     uvicorn.run(
-        socket_app,
-        host=host,
-        port=port,
-        log_level='info'
+        'app:socket_app' if workers > 1 else socket_app,
+        workers=workers,
+        log_level='info',
+        **bind
     )
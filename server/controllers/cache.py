@@ -0,0 +1,117 @@
+"""In-memory response cache with stale-while-revalidate."""
+
+import json
+import time
+import asyncio
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+
+class CacheEntry:
+    """A cached upstream payload and its validators."""
+
+    def __init__(self, value, ttl):
+        self.value = value
+        self.body = json.dumps(value, separators=(',', ':')).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+
+    def is_fresh(self):
+        return time.monotonic() < self.expires_at
+
+    def max_age(self):
+        return max(int(self.expires_at - time.monotonic()), 0)
+
+
+class ResponseCache:
+    """
+    Cache upstream payloads per key for `ttl` seconds.
+    
+    Once an entry expires it is still served for up to `stale_ttl` seconds
+    while a single background refresh runs. Concurrent misses for the same
+    key share one upstream call.
+    """
+
+    def __init__(self, ttl, stale_ttl=None):
+        self.ttl = ttl
+        self.stale_ttl = ttl * 10 if stale_ttl is None else stale_ttl
+        self._entries = {}
+        self._inflight = {}
+
+    async def get(self, key, loader):
+        """
+        Get the cached entry for a key, loading it when missing or too old.
+        
+        Args:
+            key: Cache key
+            loader: Coroutine function returning the payload to cache
+            
+        Returns:
+            CacheEntry: Fresh or stale-but-usable entry
+        """
+        entry = self._entries.get(key)
+        
+        if entry is not None:
+            if entry.is_fresh():
+                return entry
+            if time.monotonic() < entry.expires_at + self.stale_ttl:
+                # Serve stale while one refresh runs in the background
+                self._refresh(key, loader).add_done_callback(self._log_failure)
+                return entry
+        
+        return await asyncio.shield(self._refresh(key, loader))
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when no key is given."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def _refresh(self, key, loader):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+        return task
+
+    async def _load(self, key, loader):
+        try:
+            entry = CacheEntry(await loader(), self.ttl)
+            self._entries[key] = entry
+            return entry
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f'[fastapi] background cache refresh failed: {task.exception()}')
+
+
+def cached_response(request: Request, entry: CacheEntry, stale_ttl: int = 0):
+    """
+    Build a response for a cache entry, honouring If-None-Match.
+    
+    Args:
+        request: FastAPI request object
+        entry: Cache entry to send
+        stale_ttl: Seconds clients may keep using the payload while revalidating
+        
+    Returns:
+        Response: 304 when the client already has this payload, otherwise JSON
+    """
+    headers = {
+        'ETag': entry.etag,
+        'Cache-Control': f'private, max-age={entry.max_age()}, stale-while-revalidate={int(stale_ttl)}'
+    }
+    
+    if_none_match = request.headers.get('if-none-match', '')
+    tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    if entry.etag in tags or '*' in tags:
+        return Response(status_code=304, headers=headers)
+    
+    # The body was serialized once when the entry was stored
+    return Response(content=entry.body, media_type='application/json', headers=headers)
@@ -0,0 +1,200 @@
+"""In-memory duplicate filter for message hashes, in front of the unique index."""
+
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from controllers.metrics import mongo_timer
+from settings import get_settings
+
+
+settings = get_settings()
+CAPACITY = settings.message_dedupe_capacity
+ERROR_RATE = settings.message_dedupe_error_rate
+RECENT_SIZE = settings.message_dedupe_recent
+REBUILD_INTERVAL = settings.message_dedupe_rebuild_interval
+
+# Hashes per batch when streaming them out of the collection
+LOAD_BATCH_SIZE = 10000
+
+NEW = 'new'
+MAYBE = 'maybe'
+DUPLICATE = 'duplicate'
+
+
+class BloomFilter:
+    """
+    Bloom filter over sha256 hex digests.
+    
+    The digests are already uniformly random, so the bit positions come
+    straight from them with double hashing instead of hashing again.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        value = int(digest[:32], 16)
+        first, second = value >> 64, (value & 0xFFFFFFFFFFFFFFFF) | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class MessageDedupe:
+    """
+    Tell new message hashes from duplicates without asking MongoDB.
+    
+    An LRU of recently seen hashes answers exact matches, so repeats during
+    chat spam get `DUPLICATE`. Otherwise the Bloom filter over every stored
+    hash answers `NEW` when the hash is definitely not stored, and `MAYBE`
+    (a stored hash, or a false positive) when only the database can tell.
+    
+    `start` loads the filter in the background by streaming the `hash`
+    field, and rebuilds it every `rebuild_interval` seconds. Bloom filters cannot drop
+    entries, so deleted hashes linger as `MAYBE` until the next rebuild.
+    Until the first load finishes (or when it is never started) every hash
+    that misses the LRU is `MAYBE`. The app only starts it in write-behind
+    mode, the only place a `NEW` saves a lookup.
+    
+    Deletes only clear the LRU of the worker that served them, so with
+    several workers `trust_recent` is off and an LRU hit is answered with
+    `MAYBE` too. The caller then asks the database.
+    """
+
+    def __init__(self, db, capacity=CAPACITY, error_rate=ERROR_RATE, recent_size=RECENT_SIZE,
+                 rebuild_interval=REBUILD_INTERVAL, trust_recent=True):
+        self.db = db
+        self.trust_recent = trust_recent
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.recent_size = recent_size
+        self.rebuild_interval = rebuild_interval
+        self.bloom = None
+        self.recent = OrderedDict()
+        self._added_while_loading = None
+        self._task = None
+        
+        self.checks = {NEW: 0, MAYBE: 0, DUPLICATE: 0}
+        self.loads = 0
+        self.load_seconds = 0.0
+
+    def check(self, message_hash):
+        """
+        Classify a hash without touching the database.
+        
+        Args:
+            message_hash: sha256 hex digest of the message
+        
+        Returns:
+            str: DUPLICATE (seen recently), NEW (not stored) or MAYBE (look it up)
+        """
+        if message_hash in self.recent:
+            self.recent.move_to_end(message_hash)
+            verdict = DUPLICATE if self.trust_recent else MAYBE
+        elif self.bloom is not None and message_hash not in self.bloom:
+            verdict = NEW
+        else:
+            verdict = MAYBE
+        self.checks[verdict] += 1
+        return verdict
+
+    def add(self, message_hash):
+        """Record a hash that is now stored (or known to be)."""
+        self.recent[message_hash] = None
+        self.recent.move_to_end(message_hash)
+        if len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+        
+        if self.bloom is not None:
+            self.bloom.add(message_hash)
+        if self._added_while_loading is not None:
+            self._added_while_loading.add(message_hash)
+
+    def forget(self, message_hash):
+        """Drop a deleted (or never written) hash from the exact matches."""
+        self.recent.pop(message_hash, None)
+
+    def forget_recent(self):
+        """Drop every exact match, e.g. after a bulk delete."""
+        self.recent.clear()
+
+    async def load(self):
+        """Build a new filter from the hashes in the collection and swap it in."""
+        started = time.perf_counter()
+        self._added_while_loading = set()
+        try:
+            with mongo_timer('dedupe.load'):
+                total = await self.db.messages.estimated_document_count()
+                # Leave room to grow until the next rebuild
+                bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+                
+                cursor = self.db.messages.find({}, {'hash': 1, '_id': 0}, batch_size=LOAD_BATCH_SIZE)
+                async for document in cursor:
+                    message_hash = document.get('hash')
+                    if message_hash:
+                        bloom.add(message_hash)
+            
+            # Inserts accepted while the cursor was open may have been missed by it
+            for message_hash in self._added_while_loading:
+                bloom.add(message_hash)
+            self.bloom = bloom
+        finally:
+            self._added_while_loading = None
+        
+        self.loads += 1
+        self.load_seconds = time.perf_counter() - started
+        print(f'[fastapi] duplicate filter loaded {bloom.count} hashes in {self.load_seconds:.2f}s')
+
+    def start(self):
+        """Load the filter in the background, then rebuild it every `rebuild_interval` seconds."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the rebuilds."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.load()
+            except Exception as error:
+                # Keep using the old filter (or none), it is only ever too cautious
+                print(f'[fastapi] Error loading the duplicate filter: {error}')
+            await asyncio.sleep(self.rebuild_interval)
+
+    def metrics(self):
+        """
+        Report filter size and how checks were answered.
+        
+        Returns:
+            dict: Filter metrics
+        """
+        return {
+            'loaded': self.bloom is not None,
+            'hashes': self.bloom.count if self.bloom is not None else 0,
+            'capacity': self.bloom.capacity if self.bloom is not None else 0,
+            'bytes': len(self.bloom.bits) if self.bloom is not None else 0,
+            'recent': len(self.recent),
+            'trust_recent': self.trust_recent,
+            'checks': dict(self.checks),
+            'loads': self.loads,
+            'load_seconds': round(self.load_seconds, 4)
+        }
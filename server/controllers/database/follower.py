@@ -0,0 +1,116 @@
+"""Follower database controller."""
+
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import Request, HTTPException, Query
+from pymongo import UpdateOne, DESCENDING
+from controllers.metrics import mongo_timer
+
+
+MAX_PAGE_SIZE = 1000
+
+
+def parse_time(value: str):
+    """
+    Parse an RFC 3339 timestamp into a naive UTC datetime (as Motor returns them).
+    
+    Args:
+        value: Timestamp such as `2024-05-24T22:22:08Z`
+        
+    Returns:
+        datetime: Naive UTC datetime
+    """
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+async def latest_followed_at(db):
+    """
+    Get the newest follow time already stored.
+    
+    Args:
+        db: Motor database
+        
+    Returns:
+        datetime: Newest `followed_at`, or None when the collection is empty
+    """
+    latest = await db.followers.find_one({}, {'followed_at': 1}, sort=[('followed_at', DESCENDING)])
+    return latest['followed_at'] if latest else None
+
+
+async def save_followers(db, followers: list, sync_id):
+    """
+    Upsert a page of Helix followers.
+    
+    Args:
+        db: Motor database
+        followers: Helix follower objects
+        sync_id: Identifier of the sync run that saw them
+    """
+    operations = [
+        UpdateOne(
+            {'user_id': follower['user_id']},
+            {'$set': {
+                'user_id': follower['user_id'],
+                'user_login': follower.get('user_login'),
+                'user_name': follower.get('user_name'),
+                'followed_at': parse_time(follower['followed_at']),
+                'sync_id': sync_id
+            }},
+            upsert=True
+        )
+        for follower in followers
+    ]
+    if operations:
+        with mongo_timer('follower.save_followers'):
+            await db.followers.bulk_write(operations, ordered=False)
+
+
+async def get_followers(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+):
+    """
+    Get followers from the database, newest first.
+    
+    Args:
+        request: FastAPI request object
+        since: Only return followers who followed after this timestamp
+        limit: Maximum number of followers to return
+        
+    Returns:
+        dict: Total follower count, count since `since` and the followers
+    """
+    try:
+        db = request.app.state.db
+        query = {}
+        
+        if since is not None:
+            try:
+                query = {'followed_at': {'$gt': parse_time(since)}}
+            except ValueError:
+                raise HTTPException(status_code=400, detail='Invalid since timestamp')
+        
+        with mongo_timer('follower.get_followers'):
+            cursor = db.followers.find(query, {'_id': 0, 'sync_id': 0}).sort('followed_at', DESCENDING).limit(limit)
+            followers = await cursor.to_list(length=limit)
+            total = await db.followers.estimated_document_count()
+            new = await db.followers.count_documents(query) if since is not None else None
+        
+        for follower in followers:
+            follower['followed_at'] = follower['followed_at'].isoformat() + 'Z'
+        
+        result = {'total': total, 'followers': followers}
+        if since is not None:
+            result['new'] = new
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as error:
+        print(f'[fastapi] Error getting followers: {error}')
+        raise HTTPException(status_code=500, detail='Internal server error')
@@ -0,0 +1,133 @@
+"""Index bootstrap and query plan checks for the database collections."""
+
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+
+
+# Indexes required by the controllers: collection -> [(keys, options)]
+INDEXES = {
+    'messages': [
+        ([('hash', ASCENDING)], {'name': 'hash_unique', 'unique': True}),
+        ([('author', ASCENDING)], {'name': 'author'}),
+        ([('author', ASCENDING), ('_id', ASCENDING)], {'name': 'author_id'}),
+        ([('content', TEXT), ('author', TEXT)], {'name': 'content_text', 'weights': {'content': 10, 'author': 2}}),
+    ],
+    'followers': [
+        ([('user_id', ASCENDING)], {'name': 'user_id_unique', 'unique': True}),
+        ([('followed_at', DESCENDING)], {'name': 'followed_at'}),
+    ],
+    'requests': [
+        ([('seq', ASCENDING)], {'name': 'seq'}),
+    ],
+    'message_stats': [
+        ([('kind', ASCENDING), ('key', ASCENDING)], {'name': 'kind_key_unique', 'unique': True}),
+    ],
+}
+
+# Indexes the server cannot run without: the unique hash index is the only dedupe for messages
+REQUIRED_INDEXES = {('messages', 'hash_unique')}
+
+
+class MissingIndexError(RuntimeError):
+    """A required index could not be created or is not what it should be."""
+
+
+# Hot queries checked with explain() at startup: (label, filter, sort)
+HOT_QUERIES = [
+    ('messages by hash', {'hash': ''}, None),
+    ('messages page', {}, [('_id', ASCENDING)]),
+    ('messages by author', {'author': ''}, [('_id', ASCENDING)]),
+    ('messages search', {'$text': {'$search': 'scrambled'}}, None),
+]
+
+
+async def ensure_indexes(db):
+    """
+    Create any missing indexes and check the existing ones.
+    
+    Args:
+        db: Motor database
+        
+    Returns:
+        list: Problems found, empty when every index is in place
+        
+    Raises:
+        MissingIndexError: If one of REQUIRED_INDEXES is missing or not unique
+    """
+    problems = []
+    required = []
+    
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as error:
+                # e.g. existing duplicate hashes, or a same-keyed index without `unique`
+                problems.append(f"index {options['name']} on {collection}: {error}")
+                if (collection, options['name']) in REQUIRED_INDEXES:
+                    required.append(problems[-1])
+        
+        existing = await db[collection].index_information()
+        for keys, options in indexes:
+            # Text indexes report their keys as _fts/_ftsx, so look them up by name first
+            info = existing.get(options['name']) or next((index for index in existing.values() if index['key'] == keys), None)
+            problem = None
+            if info is None:
+                problem = f"index {options['name']} on {collection} is missing"
+            elif options.get('unique') and not info.get('unique'):
+                problem = f"index {options['name']} on {collection} is not unique"
+            if problem:
+                problems.append(problem)
+                if (collection, options['name']) in REQUIRED_INDEXES:
+                    required.append(problem)
+    
+    for problem in problems:
+        print(f'[fastapi] [indexes] {problem}')
+    
+    if required:
+        raise MissingIndexError(
+            f"{'; '.join(required)}. Remove the duplicate messages (or the conflicting index) and restart"
+        )
+    
+    return problems
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    yield plan.get('stage')
+    for child in [plan.get('inputStage'), *plan.get('inputStages', [])]:
+        if child:
+            yield from _plan_stages(child)
+
+
+async def report_query_plans(db):
+    """
+    Explain the hot message queries and flag any collection scans.
+    
+    Args:
+        db: Motor database
+        
+    Returns:
+        list: Labels of the queries that use a collection scan
+    """
+    scans = []
+    
+    for label, query, sort in HOT_QUERIES:
+        cursor = db.messages.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        
+        try:
+            plan = await cursor.explain()
+        except Exception as error:
+            print(f'[fastapi] [indexes] unable to explain "{label}": {error}')
+            continue
+        
+        winning = plan.get('queryPlanner', {}).get('winningPlan', {})
+        # Slot-based engine plans nest the classic tree under `queryPlan`
+        winning = winning.get('queryPlan', winning)
+        if 'COLLSCAN' in _plan_stages(winning):
+            scans.append(label)
+            print(f'[fastapi] [indexes] "{label}" uses a collection scan')
+    
+    return scans
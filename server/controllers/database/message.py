@@ -1,10 +1,144 @@
 """Message database controller."""
 
+import base64
+import asyncio
 import hashlib
+from collections import Counter
+from typing import Optional
 from urllib.parse import quote
-from fastapi import Request, HTTPException, status
+from fastapi import Request, HTTPException, Query, status
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from bson import ObjectId
+import orjson
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 from models.Messages import Message
+from controllers.database import stats
+from controllers.database.dedupe import DUPLICATE, MAYBE
+from controllers.metrics import mongo_timer
+from settings import get_settings
+
+
+# Keyset pagination on _id
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Documents per chunk when streaming NDJSON
+STREAM_BATCH_SIZE = 500
+NDJSON = 'application/x-ndjson'
+
+# Documents per insert_many call on the bulk ingest route
+BULK_BATCH_SIZE = get_settings().message_bulk_batch_size
+DUPLICATE_KEY_ERROR = 11000
+
+# Fields a client may ask for with `fields=`, `_id` is always returned
+MESSAGE_FIELDS = ('author', 'source', 'content', 'hash')
+
+
+def hash_message(message_data: dict):
+    """
+    Compute the sha256 hash used to dedupe messages.
+    
+    Args:
+        message_data: Message with author, source and content
+        
+    Returns:
+        str: Hex digest
+    """
+    data_string = f"user={message_data.get('author')}&source={message_data.get('source')}&content={message_data.get('content')}"
+    encoded_data = quote(data_string)
+    return hashlib.sha256(encoded_data.encode()).hexdigest()
+
+
+def _page_query(query: dict, after: Optional[str]):
+    """Restrict a query to documents after the given _id cursor."""
+    if after is None:
+        return query
+    if not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return {**query, '_id': {'$gt': ObjectId(after)}}
+
+
+def _projection(fields: Optional[str]):
+    """
+    Build the aggregation stage that shapes message documents.
+    
+    `_id` is converted to a string by the server, so results can be
+    serialized as they come off the cursor.
+    
+    Args:
+        fields: Comma separated field names, or None for every field
+        
+    Returns:
+        dict: `$project` or `$addFields` stage
+    """
+    if not fields:
+        return {'$addFields': {'_id': {'$toString': '$_id'}}}
+    
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in MESSAGE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    return {'$project': {'_id': {'$toString': '$_id'}, **{field: 1 for field in requested}}}
+
+
+def _page_pipeline(query: dict, fields: Optional[str], limit: Optional[int] = None):
+    pipeline = [{'$match': query}, {'$sort': {'_id': 1}}]
+    if limit:
+        pipeline.append({'$limit': limit})
+    pipeline.append(_projection(fields))
+    return pipeline
+
+
+async def _fetch_page(db, query: dict, limit: int, fields: Optional[str] = None):
+    """
+    Fetch one page of messages ordered by _id.
+    
+    Returns:
+        tuple: Page of messages and the cursor for the next page (or None)
+    """
+    # Read one extra document to know whether there is a next page
+    pipeline = _page_pipeline(query, fields, limit + 1)
+    messages = await db.messages.aggregate(pipeline).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = messages[-1]['_id']
+    
+    return messages, next_cursor
+
+
+def _json_response(payload):
+    """Serialize a payload with orjson, like the NDJSON stream, ObjectIds must already be strings."""
+    return Response(orjson.dumps(payload), media_type='application/json')
+
+
+def _wants_ndjson(request: Request):
+    return NDJSON in request.headers.get('accept', '')
+
+
+def _stream_ndjson(db, query: dict, limit: Optional[int], fields: Optional[str] = None):
+    """Stream matching messages as NDJSON in batches straight from the cursor."""
+    cursor = db.messages.aggregate(_page_pipeline(query, fields, limit), batchSize=STREAM_BATCH_SIZE)
+    
+    async def generate():
+        batch = []
+        try:
+            async for msg in cursor:
+                batch.append(orjson.dumps(msg))
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    yield b'\n'.join(batch) + b'\n'
+                    batch = []
+            if batch:
+                yield b'\n'.join(batch) + b'\n'
+        except Exception as error:
+            # Headers are already sent, all we can do is end the stream early
+            print(f'[fastapi] Error streaming messages: {error}')
+        finally:
+            await cursor.close()
+    
+    return StreamingResponse(generate(), media_type=NDJSON)
 
 
 async def create_and_save_new(request: Request, message_data: dict):
@@ -20,18 +154,17 @@ async def create_and_save_new(request: Request, message_data: dict):
     """
     try:
         # Create hash
-        data_string = f"user={message_data.get('author')}&source={message_data.get('source')}&content={message_data.get('content')}"
-        encoded_data = quote(data_string)
-        message_hash = hashlib.sha256(encoded_data.encode()).hexdigest()
+        message_hash = hash_message(message_data)
         
-        # Check for duplicates
         db = request.app.state.db
-        existing = await db.messages.count_documents({'hash': message_hash})
         
-        if existing > 0:
+        # Repeats seen recently are turned away without a round trip
+        dedupe = request.app.state.message_dedupe
+        verdict = dedupe.check(message_hash)
+        if verdict == DUPLICATE:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Message already exists')
         
-        # Create new message
+        # Create new message, duplicates are rejected by the unique index on `hash`
         new_message = {
             'hash': message_hash,
             'author': message_data.get('author'),
@@ -39,7 +172,38 @@ async def create_and_save_new(request: Request, message_data: dict):
             'content': message_data.get('content')
         }
         
-        result = await db.messages.insert_one(new_message)
+        # Write-behind mode: acknowledge now, the buffer inserts it with the next batch
+        buffer = request.app.state.message_buffer
+        if buffer is not None:
+            # The buffer answers before writing, so a hash the filter may know has to be looked up now
+            if verdict == MAYBE:
+                with mongo_timer('message.create_and_save_new'):
+                    existing = await db.messages.find_one({'hash': message_hash}, {'_id': 1})
+                if existing is not None:
+                    dedupe.add(message_hash)
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Message already exists')
+            
+            try:
+                accepted = await buffer.submit(new_message)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail='Message queue is full', headers={'Retry-After': '1'})
+            
+            if not accepted:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Message already exists')
+            
+            dedupe.add(message_hash)
+            return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={'status': 'accepted', 'hash': message_hash})
+        
+        try:
+            with mongo_timer('message.create_and_save_new'):
+                result = await db.messages.insert_one(new_message)
+        except DuplicateKeyError:
+            dedupe.add(message_hash)
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Message already exists')
+        
+        dedupe.add(message_hash)
+        await stats.record(db, stats.count_messages([new_message]))
+        await request.app.state.message_feed.publish_created([new_message])
         new_message['_id'] = str(result.inserted_id)
         
         return new_message
@@ -51,6 +215,115 @@ async def create_and_save_new(request: Request, message_data: dict):
         raise HTTPException(status_code=500, detail='Internal server error')
 
 
+def _parse_bulk_body(request: Request, body: bytes):
+    """Read a JSON array, {"messages": [...]} or NDJSON request body."""
+    if NDJSON in request.headers.get('content-type', ''):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+    
+    try:
+        data = orjson.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail='Invalid JSON body')
+    
+    if isinstance(data, dict):
+        data = data.get('messages')
+    if not isinstance(data, list):
+        raise HTTPException(status_code=400, detail='Expected an array of messages')
+    
+    return data
+
+
+def _is_valid_message(item):
+    return isinstance(item, dict) and all(
+        isinstance(item.get(field), str) and item.get(field) for field in ('author', 'source', 'content')
+    )
+
+
+async def create_many(request: Request):
+    """
+    Create and save many messages in unordered batches.
+    
+    Args:
+        request: FastAPI request object with a JSON array or NDJSON body
+        
+    Returns:
+        dict: Per-item results (created / duplicate / invalid / error) and totals
+    """
+    try:
+        items = _parse_bulk_body(request, await request.body())
+        db = request.app.state.db
+        dedupe = request.app.state.message_dedupe
+        
+        results = [None] * len(items)
+        pending = []
+        seen = set()
+        
+        for index, item in enumerate(items):
+            if not _is_valid_message(item):
+                results[index] = {'index': index, 'status': 'invalid'}
+                continue
+            
+            message_hash = hash_message(item)
+            if message_hash in seen or dedupe.check(message_hash) == DUPLICATE:
+                results[index] = {'index': index, 'status': 'duplicate', 'hash': message_hash}
+                continue
+            
+            seen.add(message_hash)
+            pending.append((index, {
+                'hash': message_hash,
+                'author': item['author'],
+                'source': item['source'],
+                'content': item['content']
+            }))
+        
+        for start in range(0, len(pending), BULK_BATCH_SIZE):
+            batch = pending[start:start + BULK_BATCH_SIZE]
+            documents = [document for _, document in batch]
+            failed = {}
+            
+            try:
+                with mongo_timer('message.create_many'):
+                    await db.messages.insert_many(documents, ordered=False)
+            except BulkWriteError as error:
+                failed = {write_error['index']: write_error['code'] for write_error in error.details.get('writeErrors', [])}
+            
+            # insert_many assigns _id on each document before sending it
+            for position, (index, document) in enumerate(batch):
+                code = failed.get(position)
+                if code is None or code == DUPLICATE_KEY_ERROR:
+                    dedupe.add(document['hash'])
+                if code is None:
+                    results[index] = {'index': index, 'status': 'created', '_id': str(document['_id']), 'hash': document['hash']}
+                elif code == DUPLICATE_KEY_ERROR:
+                    results[index] = {'index': index, 'status': 'duplicate', 'hash': document['hash']}
+                else:
+                    results[index] = {'index': index, 'status': 'error', 'hash': document['hash']}
+        
+        created = [document for index, document in pending if results[index]['status'] == 'created']
+        await stats.record(db, stats.count_messages(created))
+        await request.app.state.message_feed.publish_created(created)
+        
+        totals = {'created': 0, 'duplicate': 0, 'invalid': 0, 'error': 0}
+        for result in results:
+            totals[result['status']] += 1
+        
+        return {'total': len(items), **totals, 'results': results}
+        
+    except HTTPException:
+        raise
+    except Exception as error:
+        print(f'[fastapi] Error creating messages in bulk: {error}')
+        raise HTTPException(status_code=500, detail='Internal server error')
+
+
 async def delete_by_id(request: Request, id: str):
     """
     Delete a message by ID.
@@ -67,10 +340,19 @@ async def delete_by_id(request: Request, id: str):
             raise HTTPException(status_code=400, detail='Invalid ID format')
             
         db = request.app.state.db
-        result = await db.messages.delete_one({'_id': ObjectId(id)})
+        with mongo_timer('message.delete_by_id'):
+            deleted = await db.messages.find_one_and_delete({'_id': ObjectId(id)}, projection={'author': 1, 'source': 1, 'hash': 1})
         
-        if result.deleted_count == 0:
+        if deleted is None:
             raise HTTPException(status_code=410, detail='Message not found')
+        
+        # The same message may be posted again
+        request.app.state.message_dedupe.forget(deleted.get('hash'))
+        if request.app.state.message_buffer is not None:
+            request.app.state.message_buffer.forget(deleted.get('hash'))
+        
+        await stats.record(db, stats.count_messages([deleted]), sign=-1)
+        await request.app.state.message_feed.publish_deleted([deleted])
             
         return {'status': 'deleted'}
         
@@ -95,16 +377,30 @@ async def delete_all_by_author(request: Request, author: str):
     try:
         db = request.app.state.db
         
-        # Find messages first
-        messages = await db.messages.find({'author': author}).to_list(length=None)
+        # Count messages per source first, the stats need them after the delete
+        with mongo_timer('message.delete_all_by_author'):
+            by_source = await db.messages.aggregate([
+                {'$match': {'author': author}},
+                {'$group': {'_id': '$source', 'count': {'$sum': 1}}}
+            ]).to_list(length=None)
+        expected = sum(group['count'] for group in by_source)
         
-        if not messages:
+        if not expected:
             raise HTTPException(status_code=404, detail='No messages found for author')
         
         # Delete all messages
-        result = await db.messages.delete_many({'author': author})
+        with mongo_timer('message.delete_all_by_author'):
+            result = await db.messages.delete_many({'author': author})
         
-        if result.deleted_count != len(messages):
+        # Their hashes are not known here, stored ones are still caught by the filter or the index
+        request.app.state.message_dedupe.forget_recent()
+        
+        counts = Counter({('author', author): result.deleted_count, ('total', None): result.deleted_count})
+        counts.update({('source', group['_id']): group['count'] for group in by_source})
+        await stats.record(db, counts, sign=-1)
+        await request.app.state.message_feed.publish_author_deleted(author, result.deleted_count)
+        
+        if result.deleted_count != expected:
             raise Exception('Unable to delete all messages')
             
         return {'status': 'deleted', 'count': result.deleted_count}
@@ -116,54 +412,79 @@ async def delete_all_by_author(request: Request, author: str):
         raise HTTPException(status_code=500, detail='Internal server error')
 
 
-async def get_all(request: Request):
+async def get_all(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
-    Get all messages.
+    Get all messages, one page at a time.
     
     Args:
         request: FastAPI request object
+        limit: Page size (defaults to DEFAULT_PAGE_SIZE)
+        after: Cursor from the previous page's `next`
+        fields: Comma separated fields to return (defaults to all)
         
     Returns:
-        dict: All messages
+        dict: Page of messages and the `next` cursor, or an NDJSON stream
+        when the client accepts `application/x-ndjson`
     """
     try:
         db = request.app.state.db
-        messages = await db.messages.find({}).to_list(length=None)
+        query = _page_query({}, after)
         
-        # Convert ObjectId to string
-        for msg in messages:
-            msg['_id'] = str(msg['_id'])
+        if _wants_ndjson(request):
+            return _stream_ndjson(db, query, limit, fields)
         
-        return {'total': len(messages), 'messages': messages}
+        with mongo_timer('message.get_all'):
+            messages, next_cursor = await _fetch_page(db, query, limit or DEFAULT_PAGE_SIZE, fields)
         
+        return _json_response({'count': len(messages), 'messages': messages, 'next': next_cursor})
+        
+    except HTTPException:
+        raise
     except Exception as error:
         print(f'[fastapi] Error getting all messages: {error}')
         raise HTTPException(status_code=500, detail='Internal server error')
 
 
-async def get_all_by_author(request: Request, author: str):
+async def get_all_by_author(
+    request: Request,
+    author: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
-    Get all messages by an author.
+    Get all messages by an author, one page at a time.
     
     Args:
         request: FastAPI request object
         author: Author name
+        limit: Page size (defaults to DEFAULT_PAGE_SIZE)
+        after: Cursor from the previous page's `next`
+        fields: Comma separated fields to return (defaults to all)
         
     Returns:
-        dict: Messages by author
+        dict: Page of messages by author and the `next` cursor, or an NDJSON
+        stream when the client accepts `application/x-ndjson`
     """
     try:
         db = request.app.state.db
-        messages = await db.messages.find({'author': author}).to_list(length=None)
+        query = _page_query({'author': author}, after)
         
-        if not messages:
-            raise HTTPException(status_code=404, detail='No messages found')
+        if _wants_ndjson(request):
+            return _stream_ndjson(db, query, limit, fields)
         
-        # Convert ObjectId to string
-        for msg in messages:
-            msg['_id'] = str(msg['_id'])
+        with mongo_timer('message.get_all_by_author'):
+            messages, next_cursor = await _fetch_page(db, query, limit or DEFAULT_PAGE_SIZE, fields)
         
-        return {'author': author, 'total': len(messages), 'messages': messages}
+        if not messages and after is None:
+            raise HTTPException(status_code=404, detail='No messages found')
+        
+        return _json_response({'author': author, 'count': len(messages), 'messages': messages, 'next': next_cursor})
         
     except HTTPException:
         raise
@@ -172,13 +493,91 @@ async def get_all_by_author(request: Request, author: str):
         raise HTTPException(status_code=500, detail='Internal server error')
 
 
-async def get_one_by_id(request: Request, id: str):
+def _encode_search_cursor(message: dict):
+    return base64.urlsafe_b64encode(orjson.dumps([message['score'], message['_id']])).decode()
+
+
+def _decode_search_cursor(cursor: str):
+    try:
+        score, last_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), ObjectId(last_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    source: Optional[str] = None,
+    author: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """
+    Search message content by keyword, best matches first.
+    
+    Args:
+        request: FastAPI request object
+        q: Search terms (MongoDB text search syntax)
+        source: Only return messages from this source
+        author: Only return messages by this author
+        limit: Page size
+        after: Cursor from the previous page's `next`
+        fields: Comma separated fields to return (defaults to all)
+        
+    Returns:
+        dict: Page of messages with their `score` and the `next` cursor
+    """
+    try:
+        db = request.app.state.db
+        
+        query = {'$text': {'$search': q}}
+        if source is not None:
+            query['source'] = source
+        if author is not None:
+            query['author'] = author
+        
+        # $text has to be the first stage, the score exists only after it
+        pipeline = [{'$match': query}, {'$addFields': {'score': {'$meta': 'textScore'}}}]
+        
+        if after is not None:
+            score, last_id = _decode_search_cursor(after)
+            pipeline.append({'$match': {'$or': [
+                {'score': {'$lt': score}},
+                {'score': score, '_id': {'$gt': last_id}}
+            ]}})
+        
+        projection = _projection(fields)
+        if '$project' in projection:
+            projection['$project']['score'] = 1
+        
+        pipeline += [{'$sort': {'score': -1, '_id': 1}}, {'$limit': limit + 1}, projection]
+        with mongo_timer('message.search'):
+            messages = await db.messages.aggregate(pipeline).to_list(length=limit + 1)
+        
+        next_cursor = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_cursor = _encode_search_cursor(messages[-1])
+        
+        return _json_response({'query': q, 'count': len(messages), 'messages': messages, 'next': next_cursor})
+        
+    except HTTPException:
+        raise
+    except Exception as error:
+        print(f'[fastapi] Error searching messages: {error}')
+        raise HTTPException(status_code=500, detail='Internal server error')
+
+
+async def get_one_by_id(request: Request, id: str, fields: Optional[str] = None):
     """
     Get a single message by ID.
     
     Args:
         request: FastAPI request object
         id: Message ID
+        fields: Comma separated fields to return (defaults to all)
         
     Returns:
         dict: Message data
@@ -188,13 +587,14 @@ async def get_one_by_id(request: Request, id: str):
             raise HTTPException(status_code=400, detail='Invalid ID format')
             
         db = request.app.state.db
-        message = await db.messages.find_one({'_id': ObjectId(id)})
+        pipeline = [{'$match': {'_id': ObjectId(id)}}, {'$limit': 1}, _projection(fields)]
+        with mongo_timer('message.get_one_by_id'):
+            messages = await db.messages.aggregate(pipeline).to_list(length=1)
         
-        if not message:
+        if not messages:
             raise HTTPException(status_code=404, detail='Message not found')
         
-        message['_id'] = str(message['_id'])
-        return message
+        return _json_response(messages[0])
         
     except HTTPException:
         raise
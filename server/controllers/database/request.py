@@ -0,0 +1,355 @@
+"""Song request queue: in-memory priority heap, persisted with write-behind."""
+
+import re
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+from fastapi import Request, HTTPException, Query, status
+from pymongo import ASCENDING, DeleteOne, ReplaceOne
+from controllers.metrics import mongo_timer
+from settings import get_settings
+
+
+settings = get_settings()
+QUEUE_SIZE = settings.request_queue_size
+FLUSH_INTERVAL = settings.request_flush_interval
+OVERLAY_SIZE = settings.request_overlay_size
+
+# Higher goes first, equal priorities keep arrival order
+PRIORITIES = {
+    'broadcaster': 3,
+    'moderator': 2,
+    'mod': 2,
+    'vip': 1,
+    'subscriber': 1,
+    'sub': 1,
+}
+
+MAX_PAGE_SIZE = 500
+
+# Longest wait between retries while the requests collection cannot be written
+MAX_RETRY_DELAY = 30
+
+SPOTIFY_TRACK = re.compile(r'(?:spotify:track:|open\.spotify\.com/(?:intl-[\w-]+/)?track/)([A-Za-z0-9]{22})')
+SPOTIFY_ID = re.compile(r'^[A-Za-z0-9]{22}$')
+
+
+def normalize_track(url: str):
+    """
+    Reduce a track link to a stable ID, so the same song dedupes however it was shared.
+    
+    Args:
+        url: Spotify / YouTube link, Spotify URI or bare Spotify track ID
+    
+    Returns:
+        str: `spotify:<id>`, `youtube:<id>`, or the link without query and fragment
+    """
+    url = url.strip()
+    match = SPOTIFY_TRACK.search(url)
+    if match:
+        return f'spotify:{match.group(1)}'
+    if SPOTIFY_ID.match(url):
+        return f'spotify:{url}'
+    
+    parsed = urlparse(url if '://' in url else f'https://{url}')
+    host = parsed.netloc.lower().removeprefix('www.').removeprefix('m.').removeprefix('music.')
+    if host == 'youtu.be' and parsed.path.strip('/'):
+        return f"youtube:{parsed.path.strip('/')}"
+    if host == 'youtube.com':
+        video = parse_qs(parsed.query).get('v')
+        if video:
+            return f'youtube:{video[0]}'
+    
+    return f"{host}{parsed.path.rstrip('/')}"
+
+
+class RequestQueue:
+    """
+    Song requests ordered by priority, then arrival.
+    
+    Entries live in a heap of `(-priority, seq, track)` tuples, so adding
+    and taking the next request are O(log n). Removing one drops it from
+    the `entries` dict and leaves its heap tuple behind, it is skipped when
+    it reaches the top. `entries` doubles as the dedupe set of queued
+    track IDs.
+    
+    Changes are written to the `requests` collection by a background task
+    every `flush_interval` seconds with one bulk_write, and the overlays get
+    one `requests.updated` event per flush, however many requests arrived
+    in between. While writes fail the flusher backs off, up to
+    MAX_RETRY_DELAY seconds between attempts, and the overlays are not told
+    about changes that were not stored. `load` rebuilds the queue from the
+    collection on startup.
+    """
+
+    def __init__(self, db, sio, max_size=QUEUE_SIZE, flush_interval=FLUSH_INTERVAL, overlay_size=OVERLAY_SIZE):
+        self.db = db
+        self.sio = sio
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.overlay_size = overlay_size
+        self.entries = {}
+        self._heap = []
+        self._seq = itertools.count()
+        # track -> document to write, or None to delete it
+        self._dirty = {}
+        self._changed = asyncio.Event()
+        self._task = None
+        self._failures = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    async def load(self):
+        """Rebuild the queue from the requests collection."""
+        with mongo_timer('request.load'):
+            documents = await self.db.requests.find({}).sort('seq', ASCENDING).to_list(length=None)
+        
+        self.entries = {}
+        for document in documents:
+            document['track'] = document.pop('_id')
+            self.entries[document['track']] = document
+        self._heap = [(-entry['priority'], entry['seq'], track) for track, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+        self._seq = itertools.count(documents[-1]['seq'] + 1 if documents else 0)
+        
+        if self.entries:
+            print(f'[fastapi] restored {len(self.entries)} queued song requests')
+
+    def add(self, url: str, author: str, source: Optional[str] = None, role: Optional[str] = None):
+        """
+        Queue a request.
+        
+        Args:
+            url: Track link
+            author: Who requested it
+            source: Where it was requested from (twitch, discord, ...)
+            role: Requester's highest role, see PRIORITIES
+        
+        Returns:
+            dict: The queued entry, or None if the track is already queued
+        
+        Raises:
+            OverflowError: If the queue is full
+        """
+        track = normalize_track(url)
+        if track in self.entries:
+            return None
+        if len(self.entries) >= self.max_size:
+            raise OverflowError('request queue is full')
+        
+        entry = {
+            'track': track,
+            'url': url,
+            'author': author,
+            'source': source,
+            'priority': PRIORITIES.get((role or '').lower(), 0),
+            'seq': next(self._seq),
+            'requested_at': int(time.time() * 1000),
+        }
+        self.entries[track] = entry
+        heapq.heappush(self._heap, (-entry['priority'], entry['seq'], track))
+        self._mark(track, entry)
+        return entry
+
+    def _live(self, item):
+        entry = self.entries.get(item[2])
+        return entry is not None and entry['seq'] == item[1]
+
+    def pop(self):
+        """
+        Take the next request off the queue.
+        
+        Returns:
+            dict: Highest priority, oldest entry, or None when empty
+        """
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if self._live(item):
+                entry = self.entries.pop(item[2])
+                self._mark(item[2], None)
+                return entry
+        return None
+
+    def remove(self, track: str):
+        """
+        Drop a queued request.
+        
+        Args:
+            track: Normalized track ID, or a link to normalize
+        
+        Returns:
+            dict: The removed entry, or None if it was not queued
+        """
+        if track not in self.entries:
+            track = normalize_track(track)
+        entry = self.entries.pop(track, None)
+        if entry is not None:
+            self._mark(track, None)
+            # Removed tuples are skipped lazily, rebuild once they are most of the heap
+            if len(self._heap) > 2 * len(self.entries) + 64:
+                self._heap = [item for item in self._heap if self._live(item)]
+                heapq.heapify(self._heap)
+        return entry
+
+    def peek(self, limit: int):
+        """
+        The next `limit` requests in play order, without removing them.
+        
+        Returns:
+            list: Entries, O(n log limit)
+        """
+        items = heapq.nsmallest(limit, (item for item in self._heap if self._live(item)))
+        return [self.entries[item[2]] for item in items]
+
+    def _mark(self, track, entry):
+        self._dirty[track] = entry
+        self._changed.set()
+
+    def start(self):
+        """Start the background flusher."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever changed since the last flush."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush()
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            # Let a burst of requests gather into one write and one overlay update
+            await asyncio.sleep(self.flush_interval)
+            try:
+                written = await self._flush()
+            except Exception as error:
+                print(f'[fastapi] Error pushing song request queue: {error}')
+                continue
+            
+            if written:
+                self._failures = 0
+            else:
+                self._failures += 1
+                await asyncio.sleep(min(MAX_RETRY_DELAY, self.flush_interval * 2 ** self._failures))
+
+    async def _flush(self):
+        """
+        Write the pending changes and update the overlays.
+        
+        Returns:
+            bool: False if the write failed, the changes are kept for a retry
+        """
+        self._changed.clear()
+        if not self._dirty:
+            return True
+        dirty, self._dirty = self._dirty, {}
+        
+        operations = [
+            DeleteOne({'_id': track}) if entry is None
+            else ReplaceOne({'_id': track}, {key: value for key, value in entry.items() if key != 'track'}, upsert=True)
+            for track, entry in dirty.items()
+        ]
+        try:
+            with mongo_timer('request.flush'):
+                await self.db.requests.bulk_write(operations, ordered=False)
+        except Exception as error:
+            # Put back anything not superseded since, the next flush retries it
+            print(f'[fastapi] Error persisting {len(operations)} song request changes: {error}')
+            for track, entry in dirty.items():
+                self._dirty.setdefault(track, entry)
+            self._changed.set()
+            return False
+        
+        await self.sio.emit('requests.updated', {'total': len(self.entries), 'requests': self.peek(self.overlay_size)})
+        return True
+
+
+def _queue(request: Request):
+    """The app's request queue, or 503 when it is disabled (several workers)."""
+    queue = request.app.state.request_queue
+    if queue is None:
+        raise HTTPException(status_code=503, detail='Song requests need the server to run a single worker')
+    return queue
+
+
+async def create_and_save_unique_request(request: Request, request_data: dict):
+    """
+    Add a song request to the queue.
+    
+    Args:
+        request: FastAPI request object
+        request_data: `url` and `author`, optionally `source` and `role`
+    
+    Returns:
+        dict: The queued entry and its position
+    """
+    url = request_data.get('url')
+    author = request_data.get('author')
+    if not isinstance(url, str) or not url.strip() or not isinstance(author, str) or not author:
+        raise HTTPException(status_code=400, detail='url and author are required')
+    
+    queue = _queue(request)
+    try:
+        entry = queue.add(url, author, request_data.get('source'), request_data.get('role'))
+    except OverflowError:
+        raise HTTPException(status_code=503, detail='Request queue is full', headers={'Retry-After': '30'})
+    
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Song already requested')
+    
+    return {'status': 'queued', 'request': entry, 'total': len(queue)}
+
+
+async def get_request_queue(request: Request, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    List the queued song requests in play order.
+    
+    Args:
+        request: FastAPI request object
+        limit: How many to return
+    
+    Returns:
+        dict: Total queued and the next `limit` requests
+    """
+    queue = _queue(request)
+    return {'total': len(queue), 'requests': queue.peek(limit)}
+
+
+async def next_request(request: Request):
+    """
+    Take the next song request off the queue.
+    
+    Returns:
+        dict: The request to play
+    """
+    entry = _queue(request).pop()
+    if entry is None:
+        raise HTTPException(status_code=404, detail='Request queue is empty')
+    return entry
+
+
+async def delete_request(request: Request, track: str):
+    """
+    Remove a song request from the queue.
+    
+    Args:
+        request: FastAPI request object
+        track: Normalized track ID (as returned in `track`)
+    
+    Returns:
+        dict: Success message
+    """
+    if _queue(request).remove(track) is None:
+        raise HTTPException(status_code=404, detail='Request not found')
+    return {'status': 'deleted'}
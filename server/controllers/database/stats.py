@@ -0,0 +1,135 @@
+"""Message statistics controller."""
+
+import asyncio
+from collections import Counter
+from fastapi import Request, HTTPException
+from pymongo import UpdateOne
+from controllers.metrics import mongo_timer
+
+
+def count_messages(messages):
+    """
+    Count messages per author, per source and in total.
+    
+    Counters are stored in `message_stats`, one document per (kind, key)
+    where kind is `author`, `source` or `total`.
+    
+    Args:
+        messages: Iterable of message documents
+        
+    Returns:
+        Counter: Counts keyed by (kind, key)
+    """
+    counts = Counter()
+    for msg in messages:
+        counts[('author', msg.get('author'))] += 1
+        counts[('source', msg.get('source'))] += 1
+        counts[('total', None)] += 1
+    return counts
+
+
+async def record(db, counts: Counter, sign: int = 1):
+    """
+    Apply counter deltas to the stats collection.
+    
+    A failure here never fails the request that caused it, the counters can
+    be recovered with a rebuild.
+    
+    Args:
+        db: Motor database
+        counts: Counts keyed by (kind, key)
+        sign: 1 for inserts, -1 for deletes
+    """
+    operations = [
+        UpdateOne({'kind': kind, 'key': key}, {'$inc': {'count': sign * count}}, upsert=True)
+        for (kind, key), count in counts.items()
+        if count
+    ]
+    if not operations:
+        return
+    
+    try:
+        with mongo_timer('stats.record'):
+            await db.message_stats.bulk_write(operations, ordered=False)
+    except Exception as error:
+        print(f'[fastapi] Error updating message stats: {error}')
+
+
+async def get_stats(request: Request):
+    """
+    Get message counts per author and per source.
+    
+    Args:
+        request: FastAPI request object
+        
+    Returns:
+        dict: Total and per-author / per-source counts
+    """
+    try:
+        db = request.app.state.db
+        stats = {'total': 0, 'authors': {}, 'sources': {}}
+        
+        with mongo_timer('stats.get_stats'):
+            counters = await db.message_stats.find({'count': {'$gt': 0}}, {'_id': 0}).to_list(length=None)
+        
+        for doc in counters:
+            if doc['kind'] == 'total':
+                stats['total'] = doc['count']
+            else:
+                stats[f"{doc['kind']}s"][str(doc['key'])] = doc['count']
+        
+        return stats
+        
+    except Exception as error:
+        print(f'[fastapi] Error getting message stats: {error}')
+        raise HTTPException(status_code=500, detail='Internal server error')
+
+
+async def rebuild(db):
+    """
+    Recompute every counter from the messages collection.
+    
+    Run from the server directory with `python -m controllers.database.stats`
+    to recover counters that drifted.
+    
+    Args:
+        db: Motor database
+    """
+    def group_by(kind, field):
+        return [
+            {'$group': {'_id': field, 'count': {'$sum': 1}}},
+            {'$project': {'_id': 0, 'kind': {'$literal': kind}, 'key': '$_id', 'count': 1}}
+        ]
+    
+    pipeline = [
+        *group_by('author', '$author'),
+        {'$unionWith': {'coll': 'messages', 'pipeline': group_by('source', '$source')}},
+        {'$unionWith': {'coll': 'messages', 'pipeline': group_by('total', None)}},
+        # $out swaps the collection in atomically and keeps its indexes
+        {'$out': 'message_stats'}
+    ]
+    await db.messages.aggregate(pipeline).to_list(length=None)
+
+
+async def seed(db):
+    """
+    Build the counters once for a database that predates them.
+    
+    Args:
+        db: Motor database
+    """
+    if await db.message_stats.estimated_document_count() == 0 and await db.messages.estimated_document_count() > 0:
+        print('[fastapi] seeding message stats')
+        await rebuild(db)
+
+
+if __name__ == '__main__':
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from settings import get_settings
+
+    async def main():
+        db = AsyncIOMotorClient(get_settings().db_uri).get_database()
+        await rebuild(db)
+        print(f'[fastapi] rebuilt message stats: {await db.message_stats.count_documents({})} counters')
+    
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+"""Write-behind buffer with group commit for new messages."""
+
+import time
+import asyncio
+from collections import OrderedDict
+from pymongo.errors import BulkWriteError
+from controllers.database import stats
+from controllers.metrics import mongo_timer
+from settings import get_settings
+
+
+settings = get_settings()
+WRITE_BEHIND = settings.message_write_behind
+BATCH_SIZE = settings.message_write_batch_size
+FLUSH_INTERVAL = settings.message_write_flush_interval
+QUEUE_SIZE = settings.message_write_queue_size
+RECENT_HASHES = settings.message_write_recent_hashes
+
+# How long a request waits for queue space before it is turned away
+ENQUEUE_TIMEOUT = 2.0
+DUPLICATE_KEY_ERROR = 11000
+
+# Attempts per batch when the write fails as a whole (network, failover), with doubling waits
+FLUSH_ATTEMPTS = 4
+FLUSH_RETRY_DELAY = 0.25
+
+
+class MessageWriteBuffer:
+    """
+    Accept messages into a bounded queue and write them in batches.
+    
+    A background flusher calls insert_many when `batch_size` messages are
+    waiting or `flush_interval` seconds have passed since the first one,
+    whichever comes first. `on_written` is awaited with each batch of
+    messages that made it into the collection. Hashes of messages that
+    failed to write are also dropped from `dedupe`, when one is given.
+    """
+
+    def __init__(self, db, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 queue_size=QUEUE_SIZE, recent_size=RECENT_HASHES, on_written=None, dedupe=None):
+        self.db = db
+        self.on_written = on_written
+        self.dedupe = dedupe
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recent_size = recent_size
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.recent = OrderedDict()
+        self.closed = False
+        self._task = None
+        
+        self.accepted = 0
+        self.flushes = 0
+        self.written = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+
+    def seen(self, message_hash):
+        """Return True if the hash was accepted recently."""
+        if message_hash in self.recent:
+            self.recent.move_to_end(message_hash)
+            return True
+        return False
+
+    def _remember(self, message_hash):
+        self.recent[message_hash] = None
+        if len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    def forget(self, message_hash):
+        """Drop a hash, e.g. after the message was deleted."""
+        self.recent.pop(message_hash, None)
+        if self.dedupe is not None:
+            self.dedupe.forget(message_hash)
+
+    async def submit(self, message):
+        """
+        Queue a message for the next flush.
+        
+        Args:
+            message: Message document including its `hash`
+            
+        Returns:
+            bool: False if the hash was accepted recently (a duplicate)
+            
+        Raises:
+            asyncio.TimeoutError: If the queue stayed full (backpressure)
+            RuntimeError: If the buffer is shutting down
+        """
+        if self.closed:
+            raise RuntimeError('write buffer is closed')
+        if self.seen(message['hash']):
+            return False
+        
+        self._remember(message['hash'])
+        try:
+            await asyncio.wait_for(self.queue.put(message), ENQUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.forget(message['hash'])
+            raise
+        
+        self.accepted += 1
+        return True
+
+    def start(self):
+        """Start the background flusher."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop accepting messages and flush everything still queued."""
+        if self._task is None:
+            return
+        self.closed = True
+        
+        # The sentinel lands behind every accepted message, so they are all written first.
+        # Only wait for queue space while the flusher is alive to make it.
+        while not self._task.done():
+            try:
+                self.queue.put_nowait(None)
+                break
+            except asyncio.QueueFull:
+                await asyncio.sleep(self.flush_interval)
+        try:
+            await self._task
+        except Exception as error:
+            print(f'[fastapi] Message write buffer flusher failed: {error}')
+        self._task = None
+        
+        # Whatever a failed flusher left behind is written here
+        leftover = []
+        while not self.queue.empty():
+            message = self.queue.get_nowait()
+            if message is not None:
+                leftover.append(message)
+        for start in range(0, len(leftover), self.batch_size):
+            await self._flush(leftover[start:start + self.batch_size])
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await self.queue.get()
+            if message is None:
+                return
+            
+            batch = [message]
+            deadline = loop.time() + self.flush_interval
+            done = False
+            
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if message is None:
+                    done = True
+                    break
+                batch.append(message)
+            
+            await self._flush(batch)
+            if done:
+                return
+
+    async def _insert(self, batch):
+        """
+        insert_many the batch, retrying failures of the whole write.
+        
+        Returns:
+            dict: index -> error code of the messages that were not written
+        """
+        pending = list(range(len(batch)))
+        failed = {}
+        
+        for attempt in range(FLUSH_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(FLUSH_RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                with mongo_timer('writebehind.flush'):
+                    await self.db.messages.insert_many([batch[index] for index in pending], ordered=False)
+                return failed
+            except BulkWriteError as error:
+                for write_error in error.details.get('writeErrors', []):
+                    index = pending[write_error['index']]
+                    # insert_many set _id on the first attempt, a clash on it means that attempt got through
+                    if attempt and '_id' in write_error.get('keyPattern', {}):
+                        continue
+                    failed[index] = write_error['code']
+                return failed
+            except Exception as error:
+                print(f'[fastapi] Error flushing {len(pending)} buffered messages (attempt {attempt + 1}): {error}')
+        
+        failed.update({index: None for index in pending})
+        return failed
+
+    async def _flush(self, batch):
+        started = time.perf_counter()
+        failed = await self._insert(batch)
+        
+        created = []
+        for index, message in enumerate(batch):
+            if index not in failed:
+                created.append(message)
+            elif failed[index] == DUPLICATE_KEY_ERROR:
+                self.duplicates += 1
+            else:
+                self.failed += 1
+                self.forget(message['hash'])
+        
+        # Deletes on other workers never reach this worker's hashes, so with several
+        # workers only in-flight messages are kept and the filter checks written ones
+        if self.dedupe is not None and not self.dedupe.trust_recent:
+            for message in batch:
+                self.recent.pop(message['hash'], None)
+        
+        # The messages are stored, a failing hook must not take the flusher down with it
+        try:
+            await stats.record(self.db, stats.count_messages(created))
+        except Exception as error:
+            print(f'[fastapi] Error recording stats for {len(created)} buffered messages: {error}')
+        if created and self.on_written is not None:
+            try:
+                await self.on_written(created)
+            except Exception as error:
+                print(f'[fastapi] Error publishing {len(created)} buffered messages: {error}')
+        
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.written += len(created)
+        self.flush_seconds_total += elapsed
+        self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+
+    def metrics(self):
+        """
+        Report queue and flush counters.
+        
+        Returns:
+            dict: Buffer metrics
+        """
+        return {
+            'queue_depth': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'accepted': self.accepted,
+            'written': self.written,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'flush_seconds_avg': round(self.flush_seconds_total / self.flushes, 4) if self.flushes else 0.0,
+            'flush_seconds_max': round(self.flush_seconds_max, 4)
+        }
@@ -0,0 +1,98 @@
+"""Elect one worker to run the background daemons when several are serving."""
+
+import os
+import uuid
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from settings import get_settings
+
+
+LEASE_TTL = get_settings().leader_lease_ttl
+
+
+class LeaderLease:
+    """
+    Hold a lease document in `leases` while this process is the leader.
+    
+    The lease is renewed every third of its TTL. If the leader stops
+    renewing (it crashed or lost the database), another worker takes the
+    lease over once it expires. `on_elected` and `on_demoted` are awaited
+    when this process gains or loses the lease.
+    """
+
+    def __init__(self, db, name, on_elected, on_demoted, ttl=LEASE_TTL):
+        self.db = db
+        self.name = name
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = ttl
+        self.is_leader = False
+        self._task = None
+
+    def start(self):
+        """Start competing for the lease."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Give the lease up so another worker can take over right away."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        if self.is_leader:
+            await self._demote()
+            try:
+                await self.db.leases.delete_one({'_id': self.name, 'owner': self.owner})
+            except PyMongoError as error:
+                print(f'[fastapi] unable to release {self.name} lease: {error}')
+
+    async def _run(self):
+        while True:
+            try:
+                held = await self.acquire()
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as error:
+                print(f'[fastapi] unable to renew {self.name} lease: {error}')
+                held = False
+            
+            if held and not self.is_leader:
+                print(f'[fastapi] worker {self.owner} is now running the {self.name} daemons')
+                self.is_leader = True
+                await self.on_elected()
+            elif not held and self.is_leader:
+                await self._demote()
+            
+            await asyncio.sleep(self.ttl / 3)
+
+    async def _demote(self):
+        self.is_leader = False
+        await self.on_demoted()
+
+    async def acquire(self):
+        """
+        Take or renew the lease.
+        
+        Returns:
+            bool: True if this process holds the lease
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            lease = await self.db.leases.find_one_and_update(
+                {'_id': self.name, '$or': [{'owner': self.owner}, {'expires_at': {'$lt': now}}]},
+                {'$set': {'owner': self.owner, 'expires_at': now + timedelta(seconds=self.ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds a lease that has not expired
+            return False
+        return lease is not None and lease['owner'] == self.owner
@@ -0,0 +1,175 @@
+"""Prometheus metrics: HTTP routes, upstream calls, MongoDB, Socket.IO and the event loop."""
+
+import time
+import asyncio
+from contextlib import contextmanager
+from fastapi import Request
+from fastapi.responses import Response
+from settings import get_settings
+
+# prometheus_client picks its value class from PROMETHEUS_MULTIPROC_DIR when it is first
+# imported, so .env has to be loaded (by get_settings) before that import
+get_settings()
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+
+# Sub-millisecond to a few seconds, database calls and loop lag sit at the low end
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+LOOP_LAG_INTERVAL = 0.5
+
+http_requests = Counter(
+    'scrambled_http_requests_total', 'HTTP requests handled', ['method', 'route', 'status']
+)
+http_latency = Histogram(
+    'scrambled_http_request_duration_seconds', 'HTTP request latency by route template', ['method', 'route']
+)
+upstream_requests = Counter(
+    'scrambled_upstream_requests_total', 'Calls to Spotify and Twitch', ['provider', 'operation', 'status']
+)
+upstream_latency = Histogram(
+    'scrambled_upstream_request_duration_seconds', 'Upstream call latency (excluding rate-limit waits)', ['provider', 'operation']
+)
+mongo_latency = Histogram(
+    'scrambled_mongo_operation_duration_seconds', 'MongoDB operation latency by controller function', ['function'],
+    buckets=FAST_BUCKETS
+)
+socketio_clients = Gauge(
+    'scrambled_socketio_clients', 'Connected Socket.IO clients', multiprocess_mode='livesum'
+)
+loop_lag = Histogram(
+    'scrambled_event_loop_lag_seconds', 'How late the event loop runs a timer', buckets=FAST_BUCKETS
+)
+
+
+@contextmanager
+def mongo_timer(function: str):
+    """
+    Time the MongoDB calls inside the block.
+    
+    Args:
+        function: Controller function label, such as `message.get_all`
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        mongo_latency.labels(function).observe(time.perf_counter() - started)
+
+
+def observe_upstream(provider: str, operation: str, status, seconds: float):
+    """Record one upstream call, `status` is `error` when no response came back."""
+    upstream_requests.labels(provider, operation, str(status)).inc()
+    upstream_latency.labels(provider, operation).observe(seconds)
+
+
+# id(route) -> prefix its router was included under, see `include_router`
+_route_prefixes = {}
+
+
+def include_router(app, router, prefix: str):
+    """
+    Include a router and label its routes with the full template.
+    
+    Newer FastAPI versions include routers lazily and leave the router's own
+    route in the scope, whose template lacks the prefix (`/messages/{author}`
+    instead of `/api/messages/{author}`).
+    
+    Args:
+        app: FastAPI application
+        router: APIRouter to include
+        prefix: Path prefix, such as `/api`
+    """
+    app.include_router(router, prefix=prefix)
+    for route in router.routes:
+        _route_prefixes[id(route)] = prefix
+
+
+def _route_label(scope):
+    route = scope.get('route')
+    if route is None:
+        # Unmatched paths all share one label so scanners can't blow up the series count
+        return 'unmatched'
+    template = getattr(route, 'path_format', None) or getattr(route, 'path', 'unmatched')
+    # Older versions copy the routes with the prefix already applied, those are not in the map
+    return _route_prefixes.get(id(route), '') + template
+
+
+class MetricsMiddleware:
+    """Count requests and time them per route template (`/api/messages/{author}`)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope it was given
+            route = _route_label(scope)
+            http_requests.labels(scope['method'], route, str(status)).inc()
+            http_latency.labels(scope['method'], route).observe(time.perf_counter() - started)
+
+
+class LoopLagMonitor:
+    """Sample how late the event loop wakes a sleeping task."""
+
+    def __init__(self, interval=LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        """Start sampling."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(loop.time() - expected, 0.0))
+
+
+async def get_metrics(request: Request):
+    """
+    Expose metrics in the Prometheus text format.
+    
+    With several workers, set PROMETHEUS_MULTIPROC_DIR so every worker's
+    samples are aggregated here.
+    
+    Args:
+        request: FastAPI request object
+    
+    Returns:
+        Response: Prometheus exposition
+    """
+    registry = REGISTRY
+    if get_settings().prometheus_multiproc_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
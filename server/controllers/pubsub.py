@@ -0,0 +1,101 @@
+"""Cross-process Socket.IO fan-out for running the server with several workers."""
+
+import json
+import asyncio
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+from motor.motor_asyncio import AsyncIOMotorClient
+from settings import get_settings
+
+
+settings = get_settings()
+MESSAGE_QUEUE = settings.socketio_message_queue
+CHANNEL = settings.socketio_channel
+
+# Capped collection size in bytes, old events are overwritten once it is full
+MONGO_QUEUE_SIZE = settings.socketio_mongo_queue_size
+RETRY_INTERVAL = 1
+
+
+class AsyncMongoManager(AsyncPubSubManager):
+    """
+    Socket.IO client manager that uses a MongoDB capped collection as its queue.
+    
+    Every worker appends its events to the collection and follows it with a
+    tailable cursor. This needs no extra service, and a standalone local
+    mongod is enough to try multi-worker mode.
+    
+    Events are stored as JSON text, the format every python-socketio release
+    decodes, and never pickled: anyone able to write to the collection could
+    otherwise run code in every worker.
+    """
+
+    name = 'asyncmongo'
+
+    def __init__(self, url, channel=CHANNEL, size=MONGO_QUEUE_SIZE, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.client = AsyncIOMotorClient(url)
+        self.db = self.client.get_default_database('scrambled')
+        self.size = size
+        self._ready = None
+
+    async def _collection(self):
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(self._create_collection())
+        await self._ready
+        return self.db[self.channel]
+
+    async def _create_collection(self):
+        try:
+            await self.db.create_collection(self.channel, capped=True, size=self.size)
+            # A tailable cursor on an empty capped collection dies right away
+            await self.db[self.channel].insert_one({'channel': None})
+        except CollectionInvalid:
+            pass
+
+    async def _publish(self, data):
+        collection = await self._collection()
+        return await collection.insert_one({'channel': self.channel, 'data': json.dumps(data)})
+
+    async def _listen(self):
+        collection = await self._collection()
+        # Only events published after this worker started are of interest
+        last = await collection.find_one({}, sort=[('$natural', -1)])
+        last_id = last['_id'] if last else None
+        
+        while True:
+            query = {'channel': self.channel}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+            try:
+                cursor = collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for document in cursor:
+                        last_id = document['_id']
+                        # Older documents (and foreign writers) may not carry text, skip them
+                        if isinstance(document.get('data'), str):
+                            yield document['data']
+            except PyMongoError as error:
+                self._get_logger().error(f'Cannot receive from mongodb: {error}')
+            await asyncio.sleep(RETRY_INTERVAL)
+
+
+def create_client_manager(url=MESSAGE_QUEUE):
+    """
+    Pick a Socket.IO client manager for the configured message queue.
+    
+    Args:
+        url: `redis://...` or `mongodb://...` URL, empty for a single process
+    
+    Returns:
+        socketio.AsyncManager: Manager to pass to the AsyncServer, or None
+    """
+    if not url:
+        return None
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return socketio.AsyncRedisManager(url, channel=CHANNEL)
+    if url.startswith(('mongodb://', 'mongodb+srv://')):
+        return AsyncMongoManager(url)
+    raise ValueError(f'Unsupported SOCKETIO_MESSAGE_QUEUE: {url}')
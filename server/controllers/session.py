@@ -0,0 +1,67 @@
+"""Shared aiohttp client session for upstream API calls."""
+
+import aiohttp
+
+
+# Connection pool sizing for the upstream APIs (Spotify, Twitch)
+POOL_LIMIT = 100
+POOL_LIMIT_PER_HOST = 20
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 30
+
+_session = None
+
+
+def create_session():
+    """
+    Create a pooled client session with keep-alive and a DNS cache.
+    
+    Returns:
+        aiohttp.ClientSession: New client session
+    """
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=15)
+    )
+
+
+async def open_session():
+    """
+    Open the process-wide client session (called from the app lifespan).
+    
+    Returns:
+        aiohttp.ClientSession: Shared client session
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = create_session()
+    return _session
+
+
+async def close_session():
+    """Close the process-wide client session."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+def get_session():
+    """
+    Get the process-wide client session.
+    
+    Returns:
+        aiohttp.ClientSession: Shared client session
+        
+    Raises:
+        RuntimeError: If the session has not been opened yet
+    """
+    if _session is None or _session.closed:
+        raise RuntimeError('HTTP session is not open')
+    return _session
@@ -1,38 +1,40 @@
 """Spotify API controller."""
 
-import os
+from typing import Optional
 from fastapi import Request, HTTPException
-import aiohttp
 
 
-async def now_playing(request: Request):
+async def now_playing(request: Request, format: Optional[str] = None):
     """
-    Get currently playing track from Spotify.
+    Get currently playing track from the server-side Spotify poller.
     
     Args:
-        request: FastAPI request object with spotify token in state
+        request: FastAPI request object
+        format: `compact` for the snapshot overlays get over Socket.IO
         
     Returns:
         dict: Currently playing track data
     """
     try:
-        endpoint = os.getenv('SPOTIFY_NOWPLAYING_ENDPOINT')
-        access_token = request.state.spotify.get('access_token')
+        poller = request.app.state.spotify_poller
+        try:
+            data = await poller.latest()
+        except RuntimeError as error:
+            raise HTTPException(status_code=503, detail=f'Spotify status not available: {error}')
+        # From the shared state when another worker runs the poller
+        snapshot = await poller.current()
         
-        if not access_token:
-            raise HTTPException(status_code=401, detail='No Spotify access token')
+        if snapshot is None:
+            raise HTTPException(status_code=503, detail='Spotify status not available yet')
+        
+        if format == 'compact':
+            return snapshot
+        
+        if not data:
+            return {'playing': False, 'message': 'No track currently playing'}
+            
+        return data
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                endpoint,
-                headers={'Authorization': f'Bearer {access_token}'}
-            ) as response:
-                if response.status == 204:
-                    return {'playing': False, 'message': 'No track currently playing'}
-                    
-                data = await response.json()
-                return data
-                
     except HTTPException:
         raise
     except Exception as error:
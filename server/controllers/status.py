@@ -0,0 +1,31 @@
+"""Server status controller."""
+
+from fastapi import Request, HTTPException
+from controllers import upstream
+
+
+async def get_status(request: Request):
+    """
+    Report upstream queueing and throttling counters, duplicate filter and write buffer metrics.
+    
+    Args:
+        request: FastAPI request object
+        
+    Returns:
+        dict: Per-provider counters, the duplicate filter, and the write buffer when it is enabled
+    """
+    try:
+        result = {'upstream': {name: provider.stats() for name, provider in upstream.providers.items()}}
+        result['duplicate_filter'] = request.app.state.message_dedupe.metrics()
+        # Indexes that failed to build at startup, the affected queries may be slow
+        result['index_problems'] = request.app.state.index_problems
+        
+        buffer = request.app.state.message_buffer
+        if buffer is not None:
+            result['write_buffer'] = buffer.metrics()
+        
+        return result
+        
+    except Exception as error:
+        print(f'[fastapi] Error getting status: {error}')
+        raise HTTPException(status_code=500, detail='Internal server error')
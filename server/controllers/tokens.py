@@ -1,42 +1,151 @@
 """Token validation and API token management."""
 
-import os
+import hmac
+import time
 import base64
+import asyncio
 from urllib.parse import urlencode
-from fastapi import Request, HTTPException, status
-import aiohttp
+from fastapi import Request, HTTPException, Depends, status
+from controllers import upstream
+from settings import Settings, get_settings
 
 
-async def validate_token(request: Request):
+# Refresh this many seconds before the upstream `expires_in` runs out
+TOKEN_REFRESH_MARGIN = 60
+
+
+class TokenManager:
+    """
+    Keep an OAuth access token in memory and refresh it ahead of expiry.
+    
+    Only one refresh runs at a time; concurrent callers await the same
+    in-flight refresh instead of starting their own.
+    """
+
+    def __init__(self, name, fetch, margin=TOKEN_REFRESH_MARGIN):
+        self.name = name
+        self._fetch = fetch
+        self._margin = margin
+        self._data = None
+        self._expires_at = 0.0
+        self._refresh_task = None
+        self._timer = None
+
+    def is_fresh(self):
+        """Return True while the cached token is outside the refresh margin."""
+        return self._data is not None and time.monotonic() < self._expires_at - self._margin
+
+    async def get(self):
+        """
+        Get a valid token, refreshing it only when needed.
+        
+        Returns:
+            dict: Token data as returned by the token endpoint
+        """
+        if self.is_fresh():
+            return self._data
+        return await self.refresh()
+
+    async def refresh(self):
+        """
+        Refresh the token, joining an in-flight refresh if there is one.
+        
+        Returns:
+            dict: Token data as returned by the token endpoint
+        """
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+        # Shield so a cancelled request doesn't cancel the shared refresh
+        return await asyncio.shield(self._refresh_task)
+
+    async def _refresh(self):
+        try:
+            data = await self._fetch()
+            
+            # Don't cache error payloads, hand them back as before
+            if not data.get('access_token'):
+                print(f'[fastapi] {self.name} token endpoint returned no access token')
+                return data
+            
+            expires_in = float(data.get('expires_in') or 3600)
+            self._data = data
+            self._expires_at = time.monotonic() + expires_in
+            self._schedule(expires_in)
+            return data
+        finally:
+            self._refresh_task = None
+
+    def _schedule(self, expires_in):
+        """Schedule a background refresh shortly before the token expires."""
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(expires_in - self._margin, 1)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._background_refresh)
+
+    def _background_refresh(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.refresh())
+        task.add_done_callback(self._log_failure)
+
+    def _log_failure(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            # The cached token stays in place until it actually expires
+            print(f'[fastapi] background {self.name} token refresh failed: {task.exception()}')
+
+    def close(self):
+        """Cancel the scheduled background refresh."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def _header_token(request: Request):
+    """Read the token from `Authorization: Bearer` or `X-Scrambled-Token`."""
+    authorization = request.headers.get('authorization')
+    if authorization:
+        scheme, _, credentials = authorization.partition(' ')
+        if scheme.lower() == 'bearer':
+            return credentials.strip()
+    return request.headers.get('x-scrambled-token')
+
+
+def _token_matches(token, expected):
+    if not isinstance(token, str) or not expected:
+        return False
+    # Constant time, so response timing doesn't leak how much of the token matched
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+async def validate_token(request: Request, settings: Settings = Depends(get_settings)):
     """
-    Validate the API token from request body or query params.
+    Validate the API token from a header, or from the query or body.
+    
+    Headers are checked first and never touch the body. The query and body
+    token are still accepted for older clients.
     
     Args:
         request: FastAPI request object
+        settings: Server settings
         
     Raises:
         HTTPException: If token is missing or invalid
     """
-    token = None
+    token = _header_token(request)
     
-    # Check query params
-    if 'token' in request.query_params:
+    if token is None:
         token = request.query_params.get('token')
-        print(f'[fastapi] token=request.query, method={request.method}')
     
-    # Check body (for POST/PUT/DELETE)
-    if request.method in ['POST', 'PUT', 'DELETE', 'PATCH']:
+    # Body fallback (for POST/PUT/DELETE), only parsed when nothing else was sent
+    if token is None and request.method in ['POST', 'PUT', 'DELETE', 'PATCH']:
         try:
             body = await request.json()
-            if 'token' in body:
+            if isinstance(body, dict):
                 token = body.get('token')
-                print(f'[fastapi] token=request.body, method={request.method}')
-        except:
+        except ValueError:
             pass
     
-    # Validate token
-    if token != os.getenv('SCRAMBLED'):
-        print('[fastapi] missing or invalid token in query or body.')
+    if not _token_matches(token, settings.api_token):
+        print(f'[fastapi] missing or invalid token, method={request.method} path={request.url.path}')
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Invalid or missing token'
@@ -45,9 +154,67 @@ async def validate_token(request: Request):
     return True
 
 
+async def fetch_twitch_token():
+    """
+    Request a new Twitch access token using the refresh token.
+    
+    Returns:
+        dict: Twitch token data
+    """
+    settings = get_settings()
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': settings.twitch_refresh_token,
+        'client_id': settings.twitch_client_id,
+        'client_secret': settings.twitch_client_secret
+    }
+    
+    response = await upstream.twitch.post(
+        settings.twitch_access_endpoint,
+        data=data,
+        headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        operation='token'
+    )
+    return response.data or {}
+
+
+async def fetch_spotify_token():
+    """
+    Request a new Spotify access token using the refresh token.
+    
+    Returns:
+        dict: Spotify token data
+    """
+    settings = get_settings()
+    
+    # Create basic auth header
+    credentials = f'{settings.spotify_client_id}:{settings.spotify_client_secret}'
+    basic_auth = base64.b64encode(credentials.encode()).decode()
+    
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': settings.spotify_refresh_token
+    }
+    
+    response = await upstream.spotify.post(
+        settings.spotify_access_endpoint,
+        data=data,
+        headers={
+            'Authorization': f'Basic {basic_auth}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        },
+        operation='token'
+    )
+    return response.data or {}
+
+
+twitch_tokens = TokenManager('twitch', fetch_twitch_token)
+spotify_tokens = TokenManager('spotify', fetch_spotify_token)
+
+
 async def get_twitch_access_token(request: Request):
     """
-    Get Twitch access token using refresh token.
+    Get Twitch access token, refreshing it only when it is about to expire.
     
     Args:
         request: FastAPI request object
@@ -55,29 +222,11 @@ async def get_twitch_access_token(request: Request):
     Returns:
         dict: Twitch token data
     """
-    client_id = os.getenv('TWITCH_CLIENT_ID')
-    client_secret = os.getenv('TWITCH_CLIENT_SECRET')
-    refresh_token = os.getenv('TWITCH_REFRESH_TOKEN')
-    token_endpoint = os.getenv('TWITCH_ACCESS_ENDPOINT')
-    
     try:
-        data = {
-            'grant_type': 'refresh_token',
-            'refresh_token': refresh_token,
-            'client_id': client_id,
-            'client_secret': client_secret
-        }
+        twitch_data = await twitch_tokens.get()
+        request.state.twitch = twitch_data
+        return twitch_data
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                token_endpoint,
-                data=data,
-                headers={'Content-Type': 'application/x-www-form-urlencoded'}
-            ) as response:
-                twitch_data = await response.json()
-                request.state.twitch = twitch_data
-                return twitch_data
-                
     except Exception as error:
         print(f'[fastapi] Error getting Twitch token: {error}')
         raise HTTPException(status_code=500, detail='Failed to get Twitch token')
@@ -85,7 +234,7 @@ async def get_twitch_access_token(request: Request):
 
 async def get_spotify_access_token(request: Request):
     """
-    Get Spotify access token using refresh token.
+    Get Spotify access token, refreshing it only when it is about to expire.
     
     Args:
         request: FastAPI request object
@@ -93,34 +242,11 @@ async def get_spotify_access_token(request: Request):
     Returns:
         dict: Spotify token data
     """
-    client_id = os.getenv('SPOTIFY_CLIENT_ID')
-    client_secret = os.getenv('SPOTIFY_CLIENT_SECRET')
-    refresh_token = os.getenv('SPOTIFY_REFRESH_TOKEN')
-    token_endpoint = os.getenv('SPOTIFY_ACCESS_ENDPOINT')
-    
     try:
-        # Create basic auth header
-        credentials = f'{client_id}:{client_secret}'
-        basic_auth = base64.b64encode(credentials.encode()).decode()
-        
-        data = {
-            'grant_type': 'refresh_token',
-            'refresh_token': refresh_token
-        }
+        spotify_data = await spotify_tokens.get()
+        request.state.spotify = spotify_data
+        return spotify_data
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                token_endpoint,
-                data=data,
-                headers={
-                    'Authorization': f'Basic {basic_auth}',
-                    'Content-Type': 'application/x-www-form-urlencoded'
-                }
-            ) as response:
-                spotify_data = await response.json()
-                request.state.spotify = spotify_data
-                return spotify_data
-                
     except Exception as error:
         print(f'[fastapi] Error getting Spotify token: {error}')
         raise HTTPException(status_code=500, detail='Failed to get Spotify token')
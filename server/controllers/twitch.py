@@ -1,125 +1,175 @@
 """Twitch API controller."""
 
-import os
+import asyncio
 from fastapi import Request, HTTPException
-import aiohttp
+from controllers import upstream
+from controllers.tokens import twitch_tokens
+from controllers.cache import ResponseCache, cached_response
+from settings import get_settings
 
 
-async def get_broadcaster(request: Request):
+settings = get_settings()
+TWITCH_API_BASE = settings.twitch_api_base
+
+# Response caches per endpoint, TTLs in seconds
+channel_cache = ResponseCache(settings.twitch_channel_cache_ttl)
+ads_cache = ResponseCache(settings.twitch_ads_cache_ttl)
+
+
+async def helix_get(endpoint: str):
     """
-    Get broadcaster information (dependency for other Twitch endpoints).
+    Call a Helix endpoint with the current Twitch token.
     
     Args:
-        request: FastAPI request object with twitch token in state
+        endpoint: Helix endpoint URL
+        
+    Returns:
+        dict: Response payload
+        
+    Raises:
+        HTTPException: If Twitch answers with an error (errors are never cached)
     """
-    # This would typically fetch and store broadcaster info
-    # For now, it's a pass-through dependency
-    pass
+    token = await twitch_tokens.get()
+    
+    response = await upstream.twitch.get(
+        endpoint,
+        headers={
+            'Authorization': f"Bearer {token.get('access_token')}",
+            'Client-Id': settings.twitch_client_id
+        }
+    )
+    
+    if response.status == 429:
+        # Still throttled after the upstream client's retries, let the caller back off
+        raise HTTPException(
+            status_code=429,
+            detail='Twitch rate limit reached',
+            headers={'Retry-After': str(int(response.retry_after()) + 1)}
+        )
+    if response.status >= 400:
+        raise HTTPException(status_code=response.status, detail=(response.data or {}).get('message', 'Twitch request failed'))
+    
+    return response.data
 
 
-async def get_channel_info(request: Request):
+async def _cached_helix_get(request: Request, cache: ResponseCache, endpoint: str):
+    """Serve a Helix endpoint through its response cache."""
+    if not request.state.twitch.get('access_token'):
+        raise HTTPException(status_code=401, detail='No Twitch access token')
+    
+    entry = await cache.get(endpoint, lambda: helix_get(endpoint))
+    return cached_response(request, entry, cache.stale_ttl)
+
+
+_broadcaster = None
+_broadcaster_lock = asyncio.Lock()
+
+
+def helix_url(path: str, broadcaster: dict):
     """
-    Get Twitch channel information.
+    Build a broadcaster-scoped Helix URL.
     
     Args:
-        request: FastAPI request object with twitch token in state
+        path: Helix path such as `channels/ads`
+        broadcaster: Resolved broadcaster identity
         
     Returns:
-        dict: Channel information
+        str: Endpoint URL
     """
-    try:
-        endpoint = os.getenv('TWITCH_CREATOR_CHANNEL_ENDPOINT')
-        access_token = request.state.twitch.get('access_token')
-        client_id = os.getenv('TWITCH_CLIENT_ID')
+    return f"{TWITCH_API_BASE}/{path}?broadcaster_id={broadcaster['user_id']}"
+
+
+async def resolve_broadcaster(db):
+    """
+    Resolve the broadcaster behind the Twitch token, once per process.
+    
+    The identity is cached in memory and persisted to the `broadcaster`
+    collection so restarts don't need a Helix round trip.
+    
+    Args:
+        db: Motor database
         
-        if not access_token:
-            raise HTTPException(status_code=401, detail='No Twitch access token')
+    Returns:
+        dict: Broadcaster `user_id`, `login` and `display_name`
+    """
+    global _broadcaster
+    if _broadcaster is not None:
+        return _broadcaster
+    
+    async with _broadcaster_lock:
+        if _broadcaster is None:
+            key = settings.twitch_client_id
+            broadcaster = await db.broadcaster.find_one({'_id': key}, {'_id': 0})
+            
+            if broadcaster is None:
+                # Without a login parameter Helix returns the token's own user
+                data = await helix_get(f'{TWITCH_API_BASE}/users')
+                user = data['data'][0]
+                broadcaster = {'user_id': user['id'], 'login': user['login'], 'display_name': user['display_name']}
+                await db.broadcaster.replace_one({'_id': key}, broadcaster, upsert=True)
+                print(f"[fastapi] resolved twitch broadcaster {broadcaster['login']} [{broadcaster['user_id']}]")
+            
+            _broadcaster = broadcaster
+    
+    return _broadcaster
+
+
+async def get_broadcaster(request: Request):
+    """
+    Get broadcaster information (dependency for other Twitch endpoints).
+    
+    Args:
+        request: FastAPI request object
+        
+    Returns:
+        dict: Broadcaster identity, also stored on `request.state.broadcaster`
+    """
+    try:
+        request.state.broadcaster = await resolve_broadcaster(request.app.state.db)
+        return request.state.broadcaster
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                endpoint,
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Client-Id': client_id
-                }
-            ) as response:
-                data = await response.json()
-                return data
-                
     except HTTPException:
         raise
     except Exception as error:
-        print(f'[fastapi] Error getting channel info: {error}')
-        raise HTTPException(status_code=500, detail='Internal server error')
+        print(f'[fastapi] Error resolving broadcaster: {error}')
+        raise HTTPException(status_code=500, detail='Failed to resolve broadcaster')
 
 
-async def get_ad_schedule(request: Request):
+async def get_channel_info(request: Request):
     """
-    Get Twitch ad schedule.
+    Get Twitch channel information.
     
     Args:
-        request: FastAPI request object with twitch token in state
+        request: FastAPI request object with twitch token and broadcaster in state
         
     Returns:
-        dict: Ad schedule data
+        Response: Channel information (cached, supports If-None-Match)
     """
     try:
-        endpoint = os.getenv('TWITCH_CREATOR_ADS_ENDPOINT')
-        access_token = request.state.twitch.get('access_token')
-        client_id = os.getenv('TWITCH_CLIENT_ID')
-        
-        if not access_token:
-            raise HTTPException(status_code=401, detail='No Twitch access token')
+        return await _cached_helix_get(request, channel_cache, helix_url('channels', request.state.broadcaster))
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                endpoint,
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Client-Id': client_id
-                }
-            ) as response:
-                data = await response.json()
-                return data
-                
     except HTTPException:
         raise
     except Exception as error:
-        print(f'[fastapi] Error getting ad schedule: {error}')
+        print(f'[fastapi] Error getting channel info: {error}')
         raise HTTPException(status_code=500, detail='Internal server error')
 
 
-async def get_followers(request: Request):
+async def get_ad_schedule(request: Request):
     """
-    Get Twitch followers.
+    Get Twitch ad schedule.
     
     Args:
-        request: FastAPI request object with twitch token in state
+        request: FastAPI request object with twitch token and broadcaster in state
         
     Returns:
-        dict: Followers data
+        Response: Ad schedule data (cached, supports If-None-Match)
     """
     try:
-        endpoint = os.getenv('TWITCH_CREATOR_FOLLOWERS_ENDPOINT')
-        access_token = request.state.twitch.get('access_token')
-        client_id = os.getenv('TWITCH_CLIENT_ID')
-        
-        if not access_token:
-            raise HTTPException(status_code=401, detail='No Twitch access token')
+        return await _cached_helix_get(request, ads_cache, helix_url('channels/ads', request.state.broadcaster))
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                endpoint,
-                headers={
-                    'Authorization': f'Bearer {access_token}',
-                    'Client-Id': client_id
-                }
-            ) as response:
-                data = await response.json()
-                return data
-                
     except HTTPException:
         raise
     except Exception as error:
-        print(f'[fastapi] Error getting followers: {error}')
+        print(f'[fastapi] Error getting ad schedule: {error}')
         raise HTTPException(status_code=500, detail='Internal server error')
@@ -0,0 +1,228 @@
+"""Rate-limit-aware HTTP client for the upstream APIs (Spotify, Twitch)."""
+
+import json
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from controllers.session import get_session
+from controllers.metrics import observe_upstream
+
+
+class UpstreamResponse:
+    """Status, headers and decoded body of an upstream response."""
+
+    def __init__(self, status, headers, data):
+        self.status = status
+        self.headers = headers
+        self.data = data
+
+    def retry_after(self, default=1.0):
+        """
+        Seconds to wait before retrying, from Retry-After or Ratelimit-Reset.
+        
+        Returns:
+            float: Delay in seconds
+        """
+        return _retry_after(self.headers, default)
+
+
+def _decode(body):
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return {'message': body.decode(errors='replace')}
+
+
+def _retry_after(headers, default=1.0):
+    value = headers.get('Retry-After')
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            # HTTP-date form
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    
+    reset = headers.get('Ratelimit-Reset')
+    if reset:
+        return max(float(reset) - time.time(), 0.0)
+    
+    return default
+
+
+class TokenBucket:
+    """
+    Space requests out to `rate` per second with bursts of up to `capacity`.
+    
+    Waiters are served in arrival order, and the bucket can be paused until
+    the upstream says requests may resume.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the given number of seconds."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def limit(self, remaining):
+        """Never hand out more tokens than the upstream says are left."""
+        self.tokens = min(self.tokens, remaining)
+
+    async def acquire(self):
+        """
+        Wait for a token.
+        
+        Returns:
+            float: Seconds spent waiting
+        """
+        started = time.monotonic()
+        
+        # asyncio.Lock wakes waiters in FIFO order, so this doubles as the queue
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - started
+                
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Upstream:
+    """
+    Send requests to one provider through its token bucket.
+    
+    429 responses pause the bucket for the advertised delay and are retried.
+    Identical in-flight GETs share a single request.
+    """
+
+    def __init__(self, name, rate, capacity, max_retries=2):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.max_retries = max_retries
+        self._inflight = {}
+        
+        self.requests = 0
+        self.queued = 0
+        self.throttled = 0
+        self.coalesced = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def get(self, url, headers=None, operation='api'):
+        """Send a GET request, see `request`."""
+        return await self.request('GET', url, headers=headers, operation=operation)
+
+    async def post(self, url, headers=None, data=None, operation='api'):
+        """Send a POST request, see `request`."""
+        return await self.request('POST', url, headers=headers, data=data, operation=operation)
+
+    async def request(self, method, url, headers=None, data=None, operation='api'):
+        """
+        Send a request once the provider's rate limit allows it.
+        
+        Args:
+            method: HTTP method
+            url: Request URL
+            headers: Request headers
+            data: Form body
+            operation: Metrics label, such as `api` or `token`
+            
+        Returns:
+            UpstreamResponse: Final response (a 429 if retries ran out)
+        """
+        if method != 'GET':
+            return await self._send(method, url, headers, data, operation)
+        
+        key = (url, tuple(sorted((headers or {}).items())))
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._send(method, url, headers, data, operation))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        
+        return await asyncio.shield(task)
+
+    async def _send(self, method, url, headers, data, operation):
+        for attempt in range(self.max_retries + 1):
+            self.queued += 1
+            try:
+                waited = await self.bucket.acquire()
+            finally:
+                self.queued -= 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.requests += 1
+            
+            started = time.perf_counter()
+            try:
+                async with get_session().request(method, url, headers=headers, data=data) as response:
+                    self._observe(response.headers)
+                    body = await response.read()
+                    result = UpstreamResponse(response.status, response.headers, _decode(body))
+            except Exception:
+                observe_upstream(self.name, operation, 'error', time.perf_counter() - started)
+                raise
+            observe_upstream(self.name, operation, result.status, time.perf_counter() - started)
+            
+            if result.status != 429 or attempt == self.max_retries:
+                return result
+            
+            self.throttled += 1
+            delay = result.retry_after()
+            print(f'[fastapi] {self.name} rate limited, retrying in {delay:.1f}s')
+            self.bucket.pause(delay)
+        
+        return result
+
+    def _observe(self, headers):
+        """Follow Twitch-style Ratelimit-Remaining / Ratelimit-Reset headers."""
+        remaining = headers.get('Ratelimit-Remaining')
+        if remaining is None:
+            return
+        
+        remaining = int(remaining)
+        self.bucket.limit(remaining)
+        if remaining == 0:
+            self.bucket.pause(_retry_after(headers))
+
+    def stats(self):
+        """
+        Report request, queue and throttling counters.
+        
+        Returns:
+            dict: Counters for this provider
+        """
+        return {
+            'requests': self.requests,
+            'queued': self.queued,
+            'throttled': self.throttled,
+            'coalesced': self.coalesced,
+            'wait_seconds_total': round(self.wait_total, 3),
+            'wait_seconds_max': round(self.wait_max, 3),
+            'paused_for': round(max(self.bucket.paused_until - time.monotonic(), 0.0), 3)
+        }
+
+
+# Twitch allows 800 points per minute; Spotify publishes no number, stay well clear
+twitch = Upstream('twitch', rate=800 / 60, capacity=20)
+spotify = Upstream('spotify', rate=5, capacity=10)
+
+providers = {'twitch': twitch, 'spotify': spotify}
@@ -0,0 +1 @@
+"""Server background daemons package."""
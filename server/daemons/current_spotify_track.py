@@ -0,0 +1,208 @@
+"""Background Spotify now-playing poller that pushes changes over Socket.IO."""
+
+import time
+import asyncio
+from controllers import upstream
+from controllers.tokens import spotify_tokens
+from settings import get_settings
+
+
+# Poll intervals in seconds
+POLL_INTERVAL = 5
+IDLE_INTERVAL = 20
+PAUSED_INTERVAL = 10
+ERROR_INTERVAL = 30
+MIN_INTERVAL = 1
+
+# Seek/drift tolerance before a progress update is pushed to clients
+PROGRESS_DRIFT_MS = 2000
+
+
+def compact_track(data):
+    """
+    Reduce a Spotify currently-playing payload to what overlays need.
+    
+    Args:
+        data: Spotify currently-playing response, or None when idle
+        
+    Returns:
+        dict: Compact track snapshot
+    """
+    item = (data or {}).get('item')
+    if not item:
+        return {'playing': False, 'is_playing': False, 'id': None, 'timestamp': int(time.time() * 1000)}
+    
+    images = item.get('album', {}).get('images') or []
+    return {
+        'playing': True,
+        'is_playing': bool(data.get('is_playing')),
+        'id': item.get('id'),
+        'title': item.get('name'),
+        'artist': ', '.join(artist.get('name') for artist in item.get('artists', [])),
+        'album': item.get('album', {}).get('name'),
+        'image': images[0].get('url') if images else None,
+        'url': item.get('external_urls', {}).get('spotify'),
+        'duration_ms': item.get('duration_ms') or 0,
+        'progress_ms': data.get('progress_ms') or 0,
+        'timestamp': int(time.time() * 1000)
+    }
+
+
+class SpotifyPoller:
+    """
+    Poll Spotify once for all clients and emit only what changed.
+    
+    When a database is given the latest poll is also stored in
+    `spotify_state`, so workers that are not running the poller can serve it.
+    """
+
+    def __init__(self, sio, db=None):
+        self.sio = sio
+        self.db = db
+        self.raw = None
+        self.snapshot = None
+        self.error = None
+        self._task = None
+        # Set once the first poll has finished, successfully or not
+        self._ready = asyncio.Event()
+
+    def start(self):
+        """Start the polling loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the polling loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def latest(self, timeout=5):
+        """
+        Get the most recent now-playing payload without calling Spotify.
+        
+        Args:
+            timeout: Seconds to wait for the first poll after startup
+            
+        Returns:
+            dict: Last Spotify payload, or None if nothing was polled yet
+            
+        Raises:
+            RuntimeError: If the last poll failed and nothing was polled before it
+        """
+        if self._task is None and self.db is not None:
+            state = await self.db.spotify_state.find_one({'_id': 'now_playing'})
+            return state['raw'] if state else None
+        
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        # A failing poller only retries every ERROR_INTERVAL, there is nothing to wait for
+        if self.raw is None and self.snapshot is None and self.error is not None:
+            raise RuntimeError(f'spotify poll failed: {self.error}')
+        return self.raw
+
+    async def current(self):
+        """
+        Get the compact snapshot for a newly connected client.
+        
+        Returns:
+            dict: Compact track snapshot, or None if nothing was polled yet
+        """
+        if self._task is None and self.db is not None:
+            state = await self.db.spotify_state.find_one({'_id': 'now_playing'})
+            return state['snapshot'] if state else None
+        return self.snapshot
+
+    async def poll(self):
+        """
+        Fetch the currently playing track from Spotify.
+        
+        Returns:
+            dict: Spotify payload, or None when nothing is playing
+        """
+        token = await spotify_tokens.get()
+        response = await upstream.spotify.get(
+            get_settings().spotify_nowplaying_endpoint,
+            headers={'Authorization': f"Bearer {token.get('access_token')}"}
+        )
+        
+        if response.status == 204:
+            return None
+        if response.status >= 400:
+            raise RuntimeError(f'spotify answered {response.status}: {response.data}')
+        return response.data
+
+    async def _run(self):
+        while True:
+            try:
+                data = await self.poll()
+                snapshot = compact_track(data)
+                await self._publish(snapshot)
+                self.raw = data
+                self.snapshot = snapshot
+                self.error = None
+                self._ready.set()
+                if self.db is not None:
+                    await self.db.spotify_state.replace_one(
+                        {'_id': 'now_playing'}, {'raw': data, 'snapshot': snapshot}, upsert=True
+                    )
+                delay = self.next_interval(snapshot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print(f'[daemon/current-track] poll failed: {error}')
+                self.error = error
+                self._ready.set()
+                delay = ERROR_INTERVAL
+            await asyncio.sleep(delay)
+
+    async def _publish(self, snapshot):
+        """Emit a track change or progress correction if anything changed."""
+        last = self.snapshot
+        
+        if last is None or last['id'] != snapshot['id']:
+            await self.sio.emit('spotify.track-changed', snapshot)
+            return
+        
+        if not snapshot['playing']:
+            return
+        
+        # Clients extrapolate progress locally, only correct them on play/pause or seeks
+        expected = last['progress_ms']
+        if last['is_playing']:
+            expected += snapshot['timestamp'] - last['timestamp']
+        
+        if last['is_playing'] != snapshot['is_playing'] or abs(snapshot['progress_ms'] - expected) > PROGRESS_DRIFT_MS:
+            await self.sio.emit('spotify.progress', {
+                'id': snapshot['id'],
+                'is_playing': snapshot['is_playing'],
+                'progress_ms': snapshot['progress_ms'],
+                'timestamp': snapshot['timestamp']
+            })
+
+    @staticmethod
+    def next_interval(snapshot):
+        """
+        Pick the next poll delay from the current playback state.
+        
+        Args:
+            snapshot: Compact track snapshot
+            
+        Returns:
+            float: Seconds until the next poll
+        """
+        if not snapshot['playing']:
+            return IDLE_INTERVAL
+        if not snapshot['is_playing']:
+            return PAUSED_INTERVAL
+        
+        # Poll just after the current track ends so the change is picked up quickly
+        remaining = (snapshot['duration_ms'] - snapshot['progress_ms']) / 1000
+        return max(MIN_INTERVAL, min(POLL_INTERVAL, remaining + 0.5))
@@ -0,0 +1,119 @@
+"""Background Twitch follower sync."""
+
+import asyncio
+from bson import ObjectId
+from yarl import URL
+from controllers.twitch import helix_get, helix_url, resolve_broadcaster
+from controllers.database.follower import latest_followed_at, parse_time, save_followers
+from settings import get_settings
+
+
+# Largest page size Helix allows for channel followers
+PAGE_SIZE = 100
+SYNC_INTERVAL = get_settings().follower_sync_interval
+
+
+class FollowerSync:
+    """
+    Mirror the channel's followers into the `followers` collection.
+    
+    Helix may count followers it never returns (e.g. banned or deleted
+    accounts), so the gap between its `total` and the stored count left by
+    the last full pass is remembered. Only a change in that gap triggers
+    another full pass.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._task = None
+        # Helix total minus stored followers after the last full pass
+        self._reconciled_gap = None
+
+    def start(self):
+        """Start the periodic sync loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the periodic sync loop."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                print(f'[daemon/follower-sync] sync failed: {error}')
+            await asyncio.sleep(SYNC_INTERVAL)
+
+    async def sync(self, full=False):
+        """
+        Walk the Helix follower pages and store what changed.
+        
+        Helix returns followers newest first, so an incremental run stops at
+        the first follower that is already known. A full run re-reads every
+        page and removes anyone who has unfollowed since.
+        
+        Args:
+            full: Re-read every page instead of stopping at known followers
+            
+        Returns:
+            int: Number of followers written
+        """
+        known_latest = None if full else await latest_followed_at(self.db)
+        sync_id = ObjectId()
+        broadcaster = await resolve_broadcaster(self.db)
+        endpoint = URL(helix_url('channels/followers', broadcaster)).update_query(first=PAGE_SIZE)
+        
+        cursor = None
+        write = None
+        written = 0
+        upstream_total = None
+        
+        while True:
+            url = endpoint.update_query(after=cursor) if cursor else endpoint
+            # Fetching this page overlaps with writing the previous one
+            page = await helix_get(str(url))
+            if write is not None:
+                await write
+            
+            upstream_total = page.get('total')
+            followers = page.get('data', [])
+            new = [
+                follower for follower in followers
+                if known_latest is None or parse_time(follower['followed_at']) > known_latest
+            ]
+            
+            write = asyncio.ensure_future(save_followers(self.db, new, sync_id)) if new else None
+            written += len(new)
+            
+            cursor = page.get('pagination', {}).get('cursor')
+            if not cursor or len(new) < len(followers):
+                break
+        
+        if write is not None:
+            await write
+        
+        if full:
+            await self.db.followers.delete_many({'sync_id': {'$ne': sync_id}})
+            if upstream_total is not None:
+                self._reconciled_gap = upstream_total - await self.db.followers.estimated_document_count()
+        elif upstream_total is not None:
+            gap = upstream_total - await self.db.followers.estimated_document_count()
+            if gap != (self._reconciled_gap or 0):
+                # Someone unfollowed (or an earlier run was cut short), reconcile with a full pass
+                print('[daemon/follower-sync] follower count drifted, running a full sync')
+                return await self.sync(full=True)
+        
+        if written:
+            print(f'[daemon/follower-sync] stored {written} followers')
+        
+        return written
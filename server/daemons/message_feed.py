@@ -0,0 +1,175 @@
+"""Live message feed: push message inserts and deletes over Socket.IO."""
+
+import time
+import asyncio
+from pymongo.errors import OperationFailure, PyMongoError
+
+
+ROOM = 'messages'
+
+# Persist the resume token at most this often (seconds) while events are flowing
+CHECKPOINT_INTERVAL = 1.0
+RETRY_INTERVAL = 5
+
+# Server error codes: change streams need a replica set / token fell off the oplog
+CHANGE_STREAMS_UNSUPPORTED = (40573, 20)
+RESUME_TOKEN_LOST = (260, 280, 286)
+
+
+def author_room(author):
+    """Room name for one author's messages."""
+    return f'{ROOM}:{author}'
+
+
+def serialize(message):
+    """Reduce a message document to the event payload."""
+    return {
+        '_id': str(message['_id']),
+        'author': message.get('author'),
+        'source': message.get('source'),
+        'content': message.get('content'),
+        'hash': message.get('hash')
+    }
+
+
+class MessageFeed:
+    """
+    Broadcast changes to the `messages` collection to Socket.IO rooms.
+    
+    Events are read from a change stream and the resume token is stored in
+    `feed_state`, so a restart carries on where the last run stopped. When
+    the server does not support change streams (a standalone mongod) the
+    feed switches to hook mode, where the message controllers publish their
+    own writes through `publish_created` / `publish_deleted`.
+    
+    With several workers only the leader tails the stream, but every worker
+    calls `prepare` so they all agree on whether the hooks are needed.
+    """
+
+    def __init__(self, db, sio):
+        self.db = db
+        self.sio = sio
+        self.hooks = False
+        self.pre_images = False
+        self._task = None
+        self._token = None
+        self._saved_at = 0.0
+
+    async def prepare(self):
+        """Use hook mode unless the server is a replica set or a sharded cluster."""
+        try:
+            hello = await self.db.command('hello')
+            self.hooks = not ('setName' in hello or hello.get('msg') == 'isdbgrid')
+        except PyMongoError as error:
+            print(f'[daemon/message-feed] unable to detect change stream support: {error}')
+            self.hooks = True
+
+    def start(self):
+        """Start tailing the change stream."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop tailing and store the last resume token."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._checkpoint(force=True)
+
+    async def _run(self):
+        if self.hooks:
+            return
+        
+        state = await self.db.feed_state.find_one({'_id': ROOM})
+        self._token = state.get('resume_token') if state else None
+        self.pre_images = await self._enable_pre_images()
+        
+        while True:
+            try:
+                await self._watch()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as error:
+                if error.code in CHANGE_STREAMS_UNSUPPORTED:
+                    print('[daemon/message-feed] change streams unavailable, publishing from the controllers')
+                    self.hooks = True
+                    return
+                if error.code in RESUME_TOKEN_LOST:
+                    print('[daemon/message-feed] resume token expired, starting from now')
+                    self._token = None
+                    continue
+                print(f'[daemon/message-feed] change stream failed: {error}')
+            except PyMongoError as error:
+                print(f'[daemon/message-feed] change stream failed: {error}')
+            
+            await asyncio.sleep(RETRY_INTERVAL)
+
+    async def _enable_pre_images(self):
+        """Ask the server to keep deleted documents so deletes can reach author rooms."""
+        try:
+            await self.db.command('collMod', 'messages', changeStreamPreAndPostImages={'enabled': True})
+            return True
+        except PyMongoError:
+            # Needs MongoDB 6.0+, deletes are then only sent to the shared room
+            return False
+
+    async def _watch(self):
+        options = {'resume_after': self._token}
+        if self.pre_images:
+            options['full_document_before_change'] = 'whenAvailable'
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'delete']}}}]
+        
+        async with self.db.messages.watch(pipeline, **options) as stream:
+            async for change in stream:
+                if change['operationType'] == 'insert':
+                    await self._emit_created(change['fullDocument'])
+                else:
+                    before = change.get('fullDocumentBeforeChange') or {}
+                    await self._emit_deleted(change['documentKey']['_id'], before.get('author'))
+                
+                self._token = change['_id']
+                await self._checkpoint()
+
+    async def _checkpoint(self, force=False):
+        if self._token is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._saved_at < CHECKPOINT_INTERVAL:
+            return
+        
+        self._saved_at = now
+        try:
+            await self.db.feed_state.update_one({'_id': ROOM}, {'$set': {'resume_token': self._token}}, upsert=True)
+        except PyMongoError as error:
+            print(f'[daemon/message-feed] unable to store resume token: {error}')
+
+    async def _emit_created(self, message):
+        await self.sio.emit('message.created', serialize(message), room=[ROOM, author_room(message.get('author'))])
+
+    async def _emit_deleted(self, message_id, author=None):
+        rooms = [ROOM, author_room(author)] if author else ROOM
+        await self.sio.emit('message.deleted', {'_id': str(message_id), 'author': author}, room=rooms)
+
+    async def publish_created(self, messages):
+        """Hook for the controllers, a no-op unless in hook mode."""
+        if not self.hooks:
+            return
+        for message in messages:
+            await self._emit_created(message)
+
+    async def publish_deleted(self, messages):
+        """Hook for the controllers, a no-op unless in hook mode."""
+        if not self.hooks:
+            return
+        for message in messages:
+            await self._emit_deleted(message['_id'], message.get('author'))
+
+    async def publish_author_deleted(self, author, count):
+        """Hook for deleting every message by an author in one go."""
+        if not self.hooks or not count:
+            return
+        await self.sio.emit('messages.deleted', {'author': author, 'count': count}, room=[ROOM, author_room(author)])
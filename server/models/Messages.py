@@ -19,8 +19,9 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __modify_schema__(cls, field_schema):
-        field_schema.update(type='string')
+    def __get_pydantic_json_schema__(cls, core_schema, handler):
+        # Pydantic v2 no longer calls __modify_schema__, and fails on classes that define it
+        return {'type': 'string'}
 
 
 class Message(BaseModel):
@@ -1,10 +1,11 @@
 """API router for Scrambled server."""
 
 from fastapi import APIRouter, Depends
-from controllers.tokens import validate_token, get_spotify_access_token, get_twitch_access_token
+from controllers.tokens import validate_token, get_twitch_access_token
 from controllers.spotify import now_playing
-from controllers.twitch import get_broadcaster, get_ad_schedule, get_channel_info, get_followers
-from controllers.database import message
+from controllers.twitch import get_broadcaster, get_ad_schedule, get_channel_info
+from controllers.database import message, stats, follower, request
+from controllers.status import get_status
 
 router = APIRouter()
 
@@ -13,7 +14,7 @@ router.add_api_route(
     '/spotify',
     now_playing,
     methods=['GET'],
-    dependencies=[Depends(validate_token), Depends(get_spotify_access_token)]
+    dependencies=[Depends(validate_token)]
 )
 
 # Twitch routes
@@ -31,21 +32,30 @@ router.add_api_route(
     dependencies=[Depends(validate_token), Depends(get_twitch_access_token), Depends(get_broadcaster)]
 )
 
+# Served from the followers collection kept up to date by the follower sync daemon
 router.add_api_route(
     '/twitch/followers',
-    get_followers,
+    follower.get_followers,
     methods=['GET'],
-    dependencies=[Depends(validate_token), Depends(get_twitch_access_token), Depends(get_broadcaster)]
+    dependencies=[Depends(validate_token)]
 )
 
+# Status routes
+router.add_api_route('/status', get_status, methods=['GET'], dependencies=[Depends(validate_token)])
+
 # Message routes
 router.add_api_route('/messages', message.get_all, methods=['GET'], dependencies=[Depends(validate_token)])
+router.add_api_route('/messages/stats', stats.get_stats, methods=['GET'], dependencies=[Depends(validate_token)])
+router.add_api_route('/messages/search', message.search, methods=['GET'], dependencies=[Depends(validate_token)])
 router.add_api_route('/message/{id}', message.get_one_by_id, methods=['GET'], dependencies=[Depends(validate_token)])
 router.add_api_route('/messages/{author}', message.get_all_by_author, methods=['GET'], dependencies=[Depends(validate_token)])
 router.add_api_route('/message', message.create_and_save_new, methods=['POST'], dependencies=[Depends(validate_token)])
+router.add_api_route('/messages/bulk', message.create_many, methods=['POST'], dependencies=[Depends(validate_token)])
 router.add_api_route('/message/{id}', message.delete_by_id, methods=['DELETE'], dependencies=[Depends(validate_token)])
 router.add_api_route('/messages/{author}', message.delete_all_by_author, methods=['DELETE'], dependencies=[Depends(validate_token)])
 
-# TODO: Request routes
-# router.add_api_route('/request', create_and_save_unique_request, methods=['POST'])
-# router.add_api_route('/requests', get_request_queue, methods=['GET'])
+# Song request routes, served from the in-memory queue
+router.add_api_route('/request', request.create_and_save_unique_request, methods=['POST'], dependencies=[Depends(validate_token)])
+router.add_api_route('/requests', request.get_request_queue, methods=['GET'], dependencies=[Depends(validate_token)])
+router.add_api_route('/requests/next', request.next_request, methods=['POST'], dependencies=[Depends(validate_token)])
+router.add_api_route('/request/{track:path}', request.delete_request, methods=['DELETE'], dependencies=[Depends(validate_token)])
@@ -0,0 +1,132 @@
+"""Server settings, read from the environment (and `.env`) once."""
+
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from dotenv import load_dotenv
+
+
+def _bool(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env(name: str, default=None, cast=str):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return cast(value)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Typed server configuration. Secrets are left out of the repr."""
+    
+    host: str = '0.0.0.0'
+    port: int = 3000
+    workers: int = 1
+    # Listen on this Unix domain socket instead of host/port
+    api_socket: str = None
+    db_uri: str = None
+    
+    # API token clients send (SCRAMBLED)
+    api_token: str = field(default=None, repr=False)
+    
+    spotify_client_id: str = None
+    spotify_client_secret: str = field(default=None, repr=False)
+    spotify_refresh_token: str = field(default=None, repr=False)
+    spotify_nowplaying_endpoint: str = None
+    spotify_access_endpoint: str = None
+    
+    twitch_client_id: str = None
+    twitch_client_secret: str = field(default=None, repr=False)
+    twitch_refresh_token: str = field(default=None, repr=False)
+    twitch_access_endpoint: str = None
+    twitch_api_base: str = 'https://api.twitch.tv/helix'
+    twitch_channel_cache_ttl: int = 300
+    twitch_ads_cache_ttl: int = 30
+    follower_sync_interval: int = 300
+    
+    message_bulk_batch_size: int = 500
+    message_write_behind: bool = False
+    message_write_batch_size: int = 200
+    message_write_flush_interval: float = 0.05
+    message_write_queue_size: int = 5000
+    message_write_recent_hashes: int = 10000
+    message_dedupe_capacity: int = 1000000
+    message_dedupe_error_rate: float = 0.001
+    message_dedupe_recent: int = 10000
+    message_dedupe_rebuild_interval: int = 3600
+    
+    request_queue_size: int = 500
+    request_flush_interval: float = 0.5
+    request_overlay_size: int = 20
+    
+    socketio_message_queue: str = ''
+    socketio_channel: str = 'socketio'
+    socketio_mongo_queue_size: int = 16 * 1024 * 1024
+    leader_lease_ttl: int = 15
+    prometheus_multiproc_dir: str = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build settings from environment variables.
+        
+        Returns:
+            Settings: Settings with defaults for anything unset
+        """
+        defaults = cls()
+        return cls(
+            host=_env('HOST', defaults.host),
+            port=_env('PORT', defaults.port, int),
+            workers=_env('WEB_CONCURRENCY', defaults.workers, int),
+            api_socket=_env('SCRAMBLED_API_SOCKET'),
+            db_uri=_env('DB_URI'),
+            api_token=_env('SCRAMBLED'),
+            spotify_client_id=_env('SPOTIFY_CLIENT_ID'),
+            spotify_client_secret=_env('SPOTIFY_CLIENT_SECRET'),
+            spotify_refresh_token=_env('SPOTIFY_REFRESH_TOKEN'),
+            spotify_nowplaying_endpoint=_env('SPOTIFY_NOWPLAYING_ENDPOINT'),
+            spotify_access_endpoint=_env('SPOTIFY_ACCESS_ENDPOINT'),
+            twitch_client_id=_env('TWITCH_CLIENT_ID'),
+            twitch_client_secret=_env('TWITCH_CLIENT_SECRET'),
+            twitch_refresh_token=_env('TWITCH_REFRESH_TOKEN'),
+            twitch_access_endpoint=_env('TWITCH_ACCESS_ENDPOINT'),
+            twitch_api_base=_env('TWITCH_API_BASE', defaults.twitch_api_base),
+            twitch_channel_cache_ttl=_env('TWITCH_CHANNEL_CACHE_TTL', defaults.twitch_channel_cache_ttl, int),
+            twitch_ads_cache_ttl=_env('TWITCH_ADS_CACHE_TTL', defaults.twitch_ads_cache_ttl, int),
+            follower_sync_interval=_env('FOLLOWER_SYNC_INTERVAL', defaults.follower_sync_interval, int),
+            message_bulk_batch_size=_env('MESSAGE_BULK_BATCH_SIZE', defaults.message_bulk_batch_size, int),
+            message_write_behind=_env('MESSAGE_WRITE_BEHIND', defaults.message_write_behind, _bool),
+            message_write_batch_size=_env('MESSAGE_WRITE_BATCH_SIZE', defaults.message_write_batch_size, int),
+            message_write_flush_interval=_env('MESSAGE_WRITE_FLUSH_INTERVAL', defaults.message_write_flush_interval, float),
+            message_write_queue_size=_env('MESSAGE_WRITE_QUEUE_SIZE', defaults.message_write_queue_size, int),
+            message_write_recent_hashes=_env('MESSAGE_WRITE_RECENT_HASHES', defaults.message_write_recent_hashes, int),
+            message_dedupe_capacity=_env('MESSAGE_DEDUPE_CAPACITY', defaults.message_dedupe_capacity, int),
+            message_dedupe_error_rate=_env('MESSAGE_DEDUPE_ERROR_RATE', defaults.message_dedupe_error_rate, float),
+            message_dedupe_recent=_env('MESSAGE_DEDUPE_RECENT', defaults.message_dedupe_recent, int),
+            message_dedupe_rebuild_interval=_env('MESSAGE_DEDUPE_REBUILD_INTERVAL', defaults.message_dedupe_rebuild_interval, int),
+            request_queue_size=_env('REQUEST_QUEUE_SIZE', defaults.request_queue_size, int),
+            request_flush_interval=_env('REQUEST_FLUSH_INTERVAL', defaults.request_flush_interval, float),
+            request_overlay_size=_env('REQUEST_OVERLAY_SIZE', defaults.request_overlay_size, int),
+            socketio_message_queue=_env('SOCKETIO_MESSAGE_QUEUE', defaults.socketio_message_queue),
+            socketio_channel=_env('SOCKETIO_CHANNEL', defaults.socketio_channel),
+            socketio_mongo_queue_size=_env('SOCKETIO_MONGO_QUEUE_SIZE', defaults.socketio_mongo_queue_size, int),
+            leader_lease_ttl=_env('LEADER_LEASE_TTL', defaults.leader_lease_ttl, int),
+            prometheus_multiproc_dir=_env('PROMETHEUS_MULTIPROC_DIR')
+        )
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Load the settings on first use and return the same object afterwards.
+    
+    Also usable as a FastAPI dependency, so tests can override it.
+    
+    Returns:
+        Settings: Server settings
+    """
+    # Modules read their settings at import time, before app.py runs its own load_dotenv()
+    load_dotenv()
+    return Settings.from_env()
@@ -0,0 +1,38 @@
+"""Make the server and bot modules importable the way server/app.py and bot/client.py import them."""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'server'))
+sys.path.insert(0, str(ROOT / 'bot'))
+
+
+async def asgi_request(app, method, path, headers=None, query_string=b'', body=b''):
+    """
+    Send one HTTP request straight to an ASGI app, without a test client.
+    
+    Returns:
+        tuple: Status, response headers (lower-cased names) and body
+    """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+        'method': method, 'path': path, 'raw_path': path.encode(), 'root_path': '',
+        'query_string': query_string, 'server': ('testserver', 80), 'client': ('testclient', 50000),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    response = {'status': None, 'headers': {}, 'body': b''}
+    
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+    
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode().lower(): value.decode() for name, value in message.get('headers', [])}
+        elif message['type'] == 'http.response.body':
+            response['body'] += message.get('body', b'')
+    
+    await app(scope, receive, send)
+    return response['status'], response['headers'], response['body']
@@ -0,0 +1,91 @@
+"""ResponseCache stale-while-revalidate and conditional responses."""
+
+import asyncio
+from starlette.requests import Request
+from controllers.cache import ResponseCache, CacheEntry, cached_response
+
+
+class Loader:
+    """Counts upstream calls, each one returns a new version of the payload."""
+
+    def __init__(self, delay=0.05):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {'version': self.calls}
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResponseCache(ttl=60)
+    loader = Loader()
+    
+    async def run():
+        return await asyncio.gather(*(cache.get('channel', loader) for _ in range(20)))
+    
+    entries = asyncio.run(run())
+    assert loader.calls == 1
+    assert {entry.value['version'] for entry in entries} == {1}
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    cache = ResponseCache(ttl=0.05, stale_ttl=60)
+    loader = Loader(delay=0.1)
+    
+    async def run():
+        await cache.get('channel', loader)
+        await asyncio.sleep(0.06)
+        
+        # Expired: answered straight away from the old entry, one refresh starts
+        started = asyncio.get_running_loop().time()
+        stale = await asyncio.gather(*(cache.get('channel', loader) for _ in range(10)))
+        waited = asyncio.get_running_loop().time() - started
+        
+        await asyncio.sleep(0.15)
+        return stale, waited, loader.calls, cache._entries['channel']
+    
+    stale, waited, calls, refreshed = asyncio.run(run())
+    assert {entry.value['version'] for entry in stale} == {1}
+    assert waited < 0.05
+    assert calls == 2
+    assert refreshed.value['version'] == 2
+
+
+def test_entry_past_the_stale_window_is_loaded_again():
+    cache = ResponseCache(ttl=0.01, stale_ttl=0.01)
+    loader = Loader(delay=0)
+    
+    async def run():
+        await cache.get('channel', loader)
+        await asyncio.sleep(0.05)
+        return await cache.get('channel', loader)
+    
+    assert asyncio.run(run()).value['version'] == 2
+
+
+def make_request(if_none_match=None):
+    headers = [(b'if-none-match', if_none_match.encode())] if if_none_match is not None else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/api/twitch', 'headers': headers, 'query_string': b''})
+
+
+def test_matching_if_none_match_gets_304_with_the_same_etag():
+    entry = CacheEntry({'data': [1, 2, 3]}, ttl=60)
+    
+    response = cached_response(make_request(f'"other", W/{entry.etag}'), entry, stale_ttl=600)
+    
+    assert response.status_code == 304
+    assert response.headers['etag'] == entry.etag
+    assert response.body == b''
+    assert 'stale-while-revalidate=600' in response.headers['cache-control']
+
+
+def test_other_etag_gets_the_body():
+    entry = CacheEntry({'data': [1, 2, 3]}, ttl=60)
+    
+    response = cached_response(make_request('"other"'), entry)
+    
+    assert response.status_code == 200
+    assert response.headers['etag'] == entry.etag
+    assert response.body == b'{"data":[1,2,3]}'
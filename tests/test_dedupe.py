@@ -0,0 +1,31 @@
+"""MessageDedupe answers."""
+
+import hashlib
+from controllers.database.dedupe import MessageDedupe, BloomFilter, DUPLICATE, MAYBE, NEW
+
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def test_recent_hit_is_duplicate_in_a_single_worker():
+    dedupe = MessageDedupe(db=None)
+    dedupe.add(digest('spam'))
+    assert dedupe.check(digest('spam')) == DUPLICATE
+    
+    dedupe.forget(digest('spam'))
+    assert dedupe.check(digest('spam')) == MAYBE
+
+
+def test_recent_hit_is_checked_with_several_workers():
+    dedupe = MessageDedupe(db=None, trust_recent=False)
+    dedupe.add(digest('spam'))
+    assert dedupe.check(digest('spam')) == MAYBE
+
+
+def test_bloom_filter_answers_new_for_unknown_hashes():
+    dedupe = MessageDedupe(db=None)
+    dedupe.bloom = BloomFilter(1000, 0.001)
+    dedupe.bloom.add(digest('stored'))
+    assert dedupe.check(digest('stored')) == MAYBE
+    assert dedupe.check(digest('never stored')) == NEW
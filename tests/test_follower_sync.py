@@ -0,0 +1,98 @@
+"""FollowerSync incremental runs and full-pass reconciliation, against fakes."""
+
+import asyncio
+from datetime import datetime, timedelta
+from daemons import follower_sync
+from daemons.follower_sync import FollowerSync
+
+
+class FakeFollowers:
+    """The `followers` collection, keyed by user_id."""
+
+    def __init__(self):
+        self.documents = {}
+
+    async def estimated_document_count(self):
+        return len(self.documents)
+
+    async def delete_many(self, query):
+        keep = query['sync_id']['$ne']
+        self.documents = {key: value for key, value in self.documents.items() if value['sync_id'] == keep}
+
+
+class FakeHelix:
+    """Channel followers, newest first, with a `total` that may count hidden ones."""
+
+    def __init__(self, count, hidden=0):
+        self.followers = []
+        self.hidden = hidden
+        self.calls = 0
+        for _ in range(count):
+            self.follow()
+
+    def follow(self):
+        followed_at = datetime(2024, 1, 1) + timedelta(minutes=len(self.followers))
+        self.followers.insert(0, {'user_id': str(len(self.followers)), 'followed_at': followed_at.strftime('%Y-%m-%dT%H:%M:%SZ')})
+
+    async def get(self, url):
+        self.calls += 1
+        return {'total': len(self.followers) + self.hidden, 'data': list(self.followers), 'pagination': {}}
+
+
+def make_sync(monkeypatch, helix):
+    followers = FakeFollowers()
+    
+    async def latest_followed_at(db):
+        stored = [document['followed_at'] for document in followers.documents.values()]
+        return max(stored) if stored else None
+    
+    async def save_followers(db, page, sync_id):
+        for follower in page:
+            followers.documents[follower['user_id']] = {
+                'followed_at': follower_sync.parse_time(follower['followed_at']), 'sync_id': sync_id
+            }
+    
+    async def resolve_broadcaster(db):
+        return {'user_id': '1'}
+    
+    monkeypatch.setattr(follower_sync, 'helix_get', helix.get)
+    monkeypatch.setattr(follower_sync, 'latest_followed_at', latest_followed_at)
+    monkeypatch.setattr(follower_sync, 'save_followers', save_followers)
+    monkeypatch.setattr(follower_sync, 'resolve_broadcaster', resolve_broadcaster)
+    monkeypatch.setattr(follower_sync, 'helix_url', lambda path, broadcaster: f'https://helix.test/{path}')
+    
+    db = type('FakeDatabase', (), {'followers': followers})()
+    return FollowerSync(db), followers
+
+
+def test_persistent_gap_runs_one_full_pass(monkeypatch):
+    helix = FakeHelix(5, hidden=2)
+    sync, followers = make_sync(monkeypatch, helix)
+    
+    asyncio.run(sync.sync())
+    # First run: the count is off by the hidden followers, so one full pass follows
+    assert helix.calls == 2
+    assert len(followers.documents) == 5
+    
+    asyncio.run(sync.sync())
+    asyncio.run(sync.sync())
+    assert helix.calls == 4
+    
+    # A new follower moves both counts together, still no full pass
+    helix.follow()
+    asyncio.run(sync.sync())
+    assert helix.calls == 5
+    assert len(followers.documents) == 6
+
+
+def test_unfollow_triggers_a_full_pass(monkeypatch):
+    helix = FakeHelix(5, hidden=2)
+    sync, followers = make_sync(monkeypatch, helix)
+    asyncio.run(sync.sync())
+    calls = helix.calls
+    
+    helix.followers.pop(2)
+    asyncio.run(sync.sync())
+    
+    assert helix.calls == calls + 2
+    assert len(followers.documents) == 4
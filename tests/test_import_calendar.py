@@ -0,0 +1,148 @@
+"""CalendarImporter: conditional fetches and reporting only what changed."""
+
+import asyncio
+import importlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from helpers import import_calendar
+from helpers.import_calendar import CalendarImporter
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def event(uid, location, days, description='Read chapter 1'):
+    start = (NOW + timedelta(days=days)).strftime('%Y%m%dT%H%M%SZ')
+    return (
+        'BEGIN:VEVENT\r\n'
+        f'UID:{uid}\r\n'
+        f'DTSTAMP:{NOW.strftime("%Y%m%dT%H%M%SZ")}\r\n'
+        f'DTSTART:{start}\r\n'
+        f'SUMMARY:{uid} due\r\n'
+        f'DESCRIPTION:{description}\r\n'
+        f'LOCATION:{location}\r\n'
+        'END:VEVENT\r\n'
+    )
+
+
+def feed(*events):
+    return ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\n' + ''.join(events) + 'END:VCALENDAR\r\n').encode()
+
+
+class FakeResponse:
+    """Just enough of an aiohttp response for CalendarImporter.refresh."""
+
+    def __init__(self, status, body=b'', headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    """Answers each get with the next response and records the request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.headers.append(headers or {})
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def courses(monkeypatch):
+    # The course locations normally come from .env
+    monkeypatch.setattr(import_calendar, 'COURSES', {
+        'prog': {'location': 'PROG-1400', 'tag_id': ''},
+        'netw': {'location': 'NETW-1100', 'tag_id': '42'},
+        'dbas': {'location': 'DBAS-1007', 'tag_id': ''},
+    })
+    monkeypatch.setattr(import_calendar, 'LOCATIONS', {'PROG-1400': 'prog', 'NETW-1100': 'netw', 'DBAS-1007': 'dbas'})
+
+
+def refresh(importer, *responses):
+    session = FakeSession(*responses)
+    changed = asyncio.run(importer.refresh(session))
+    return changed, session.headers
+
+
+def test_only_added_or_changed_events_in_the_window_are_reported(tmp_path):
+    importer = CalendarImporter(url='https://calendar.test/feed.ics', cache_path=tmp_path / 'cache.json')
+    first = feed(
+        event('a', 'PROG-1400', 3),
+        event('b', 'NETW-1100', 5),
+        event('c', 'Somewhere else', 5),
+        event('d', 'PROG-1400', 60),
+        event('e', 'PROG-1400', -2),
+    )
+    assert refresh(importer, FakeResponse(200, first, {'ETag': '"v1"'}))[0] is True
+    
+    reported = importer.upcoming(days_ahead=30)
+    assert [(event['uid'], event['course'], event['tag_id']) for event in reported] == [('a', 'prog', ''), ('b', 'netw', '42')]
+    importer.mark_reported(reported)
+    
+    second = feed(
+        event('a', 'PROG-1400', 3, description='Read chapter 2'),
+        event('b', 'NETW-1100', 5),
+        event('f', 'DBAS-1007', 1),
+    )
+    assert refresh(importer, FakeResponse(200, second, {'ETag': '"v2"'}))[0] is True
+    
+    assert [event['uid'] for event in importer.upcoming(days_ahead=30)] == ['f', 'a']
+    assert [event['uid'] for event in importer.upcoming(days_ahead=30, changed_only=False)] == ['f', 'a', 'b']
+
+
+def test_not_modified_reuses_the_cached_events(tmp_path):
+    cache_path = tmp_path / 'cache.json'
+    importer = CalendarImporter(url='https://calendar.test/feed.ics', cache_path=cache_path)
+    refresh(importer, FakeResponse(200, feed(event('a', 'PROG-1400', 3)), {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}))
+    importer.mark_reported(importer.upcoming())
+    
+    # A new run starts from the cache file
+    importer = CalendarImporter(url='https://calendar.test/feed.ics', cache_path=cache_path)
+    changed, headers = refresh(importer, FakeResponse(304))
+    
+    assert changed is False
+    assert headers[0] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert importer.upcoming() == []
+    assert [event['uid'] for event in importer.upcoming(changed_only=False)] == ['a']
+
+
+def test_same_body_is_not_parsed_again(tmp_path, monkeypatch):
+    importer = CalendarImporter(url='https://calendar.test/feed.ics', cache_path=tmp_path / 'cache.json')
+    body = feed(event('a', 'PROG-1400', 3))
+    refresh(importer, FakeResponse(200, body))
+    
+    def fail(text):
+        raise AssertionError('parsed an unchanged feed')
+    monkeypatch.setattr(import_calendar, 'parse_events', fail)
+    
+    assert refresh(importer, FakeResponse(200, body))[0] is False
+    assert [event['uid'] for event in importer.upcoming()] == ['a']
+
+
+def test_locations_map_from_the_course_env_vars(monkeypatch):
+    for name in ('PROG', 'WEBD', 'NETW', 'OSYS', 'DBAS'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('PROG', 'PROG-1400')
+    monkeypatch.setenv('NETW', 'NETW-1100')
+    
+    try:
+        module = importlib.reload(import_calendar)
+        # Courses without a location are left out instead of mapping None
+        assert module.LOCATIONS == {'PROG-1400': 'prog', 'NETW-1100': 'netw'}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(import_calendar)
@@ -0,0 +1,47 @@
+"""Startup index checks."""
+
+import asyncio
+from unittest import mock
+import pytest
+from pymongo.errors import OperationFailure
+from controllers.database import indexes
+from controllers.database.indexes import ensure_indexes, MissingIndexError
+
+
+def make_db(failing):
+    collections = {}
+    
+    def collection(name):
+        if name not in collections:
+            created = {}
+            
+            async def create_index(keys, **options):
+                if options['name'] in failing:
+                    raise OperationFailure('E11000 duplicate key error')
+                created[options['name']] = {'key': keys, 'unique': options.get('unique', False)}
+            
+            async def index_information():
+                return dict(created)
+            
+            collections[name] = mock.MagicMock(create_index=create_index, index_information=index_information)
+        return collections[name]
+    
+    db = mock.MagicMock()
+    db.__getitem__.side_effect = collection
+    return db
+
+
+def test_missing_optional_index_is_reported():
+    problems = asyncio.run(ensure_indexes(make_db({'followed_at'})))
+    
+    assert any('followed_at' in problem for problem in problems)
+
+
+def test_missing_unique_hash_index_fails():
+    with pytest.raises(MissingIndexError, match='hash_unique'):
+        asyncio.run(ensure_indexes(make_db({'hash_unique'})))
+
+
+def test_every_index_in_place():
+    assert asyncio.run(ensure_indexes(make_db(set()))) == []
+    assert ('messages', 'hash_unique') in indexes.REQUIRED_INDEXES
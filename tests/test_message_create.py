@@ -0,0 +1,49 @@
+"""POST /api/message duplicate handling, against a fake database."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from controllers.database.dedupe import MessageDedupe
+from controllers.database.message import create_and_save_new
+
+
+def make_request(trust_recent):
+    db = mock.MagicMock()
+    db.messages.insert_one = mock.AsyncMock(side_effect=lambda document: SimpleNamespace(inserted_id=ObjectId()))
+    db.message_stats.bulk_write = mock.AsyncMock()
+    state = SimpleNamespace(
+        db=db,
+        message_dedupe=MessageDedupe(db, trust_recent=trust_recent),
+        message_buffer=None,
+        message_feed=mock.AsyncMock()
+    )
+    return SimpleNamespace(app=SimpleNamespace(state=state))
+
+
+MESSAGE = {'author': 'viewer', 'source': 'twitch', 'content': 'hello'}
+
+
+def test_recent_hash_is_rejected_without_a_lookup_in_a_single_worker():
+    request = make_request(trust_recent=True)
+    asyncio.run(create_and_save_new(request, dict(MESSAGE)))
+    # Deleted by another worker (or by hand), this worker's LRU still has it
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(create_and_save_new(request, dict(MESSAGE)))
+    
+    assert error.value.status_code == 409
+    assert request.app.state.db.messages.insert_one.await_count == 1
+
+
+def test_recent_hash_goes_to_the_database_with_several_workers():
+    request = make_request(trust_recent=False)
+    asyncio.run(create_and_save_new(request, dict(MESSAGE)))
+    
+    # The row is gone, so the insert succeeds instead of a stale 409
+    saved = asyncio.run(create_and_save_new(request, dict(MESSAGE)))
+    
+    assert saved['content'] == 'hello'
+    assert request.app.state.db.messages.insert_one.await_count == 2
@@ -0,0 +1,99 @@
+"""Keyset pagination of the message list routes, against a fake database."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+import orjson
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from controllers.database.message import get_all, get_all_by_author
+
+
+class FakeCursor:
+    """Motor aggregation cursor over a list."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+def aggregate(documents):
+    """Run the few stages the page pipeline uses over a list of documents."""
+    def run(pipeline, **options):
+        result = [dict(document) for document in documents]
+        for stage in pipeline:
+            if '$match' in stage:
+                query = stage['$match']
+                after = query.get('_id', {}).get('$gt')
+                result = [
+                    document for document in result
+                    if (after is None or document['_id'] > after)
+                    and ('author' not in query or document['author'] == query['author'])
+                ]
+            elif '$sort' in stage:
+                result.sort(key=lambda document: document['_id'])
+            elif '$limit' in stage:
+                result = result[:stage['$limit']]
+            elif '$addFields' in stage:
+                result = [dict(document, _id=str(document['_id'])) for document in result]
+            elif '$project' in stage:
+                fields = [field for field in stage['$project'] if field != '_id']
+                result = [{'_id': str(document['_id']), **{field: document[field] for field in fields}} for document in result]
+        return FakeCursor(result)
+    return run
+
+
+def make_request(documents):
+    db = mock.MagicMock()
+    db.messages.aggregate = aggregate(documents)
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db=db)), headers={})
+
+
+DOCUMENTS = [
+    {'_id': ObjectId(), 'author': f'author{index % 2}', 'source': 'twitch', 'content': f'message {index}', 'hash': f'{index:064x}'}
+    for index in range(25)
+]
+
+
+def pages(route, request, limit, **params):
+    after, seen = None, []
+    while True:
+        response = asyncio.run(route(request, limit=limit, after=after, fields=None, **params))
+        page = orjson.loads(response.body)
+        assert page['count'] == len(page['messages'])
+        seen.append(page)
+        after = page['next']
+        if after is None:
+            return seen
+
+
+def test_pages_cover_every_message_once_in_order():
+    seen = pages(get_all, make_request(DOCUMENTS), limit=10)
+    
+    assert [page['count'] for page in seen] == [10, 10, 5]
+    ids = [message['_id'] for page in seen for message in page['messages']]
+    assert ids == [str(document['_id']) for document in DOCUMENTS]
+
+
+def test_exact_multiple_of_the_page_size_ends_without_an_empty_page():
+    seen = pages(get_all, make_request(DOCUMENTS[:20]), limit=10)
+    
+    assert [page['count'] for page in seen] == [10, 10]
+    assert seen[-1]['next'] is None
+
+
+def test_author_pages_only_hold_that_author():
+    seen = pages(get_all_by_author, make_request(DOCUMENTS), limit=5, author='author1')
+    
+    messages = [message for page in seen for message in page['messages']]
+    assert [message['content'] for message in messages] == [f'message {index}' for index in range(1, 25, 2)]
+    assert len({message['_id'] for message in messages}) == 12
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_all(make_request(DOCUMENTS), limit=10, after='not-an-id', fields=None))
+    assert error.value.status_code == 400
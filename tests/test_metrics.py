@@ -0,0 +1,43 @@
+"""Route labels on the HTTP metrics."""
+
+import asyncio
+from fastapi import FastAPI, APIRouter
+from prometheus_client import REGISTRY
+from controllers.metrics import MetricsMiddleware, include_router
+from conftest import asgi_request
+
+
+def sample(method, route, status='200'):
+    return REGISTRY.get_sample_value(
+        'scrambled_http_requests_total', {'method': method, 'route': route, 'status': status}
+    ) or 0
+
+
+def test_routes_under_a_prefix_get_the_full_template():
+    router = APIRouter()
+    
+    @router.get('/metrics-test/{author}')
+    async def by_author(author: str):
+        return {'author': author}
+    
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    include_router(app, router, '/api')
+    
+    before = sample('GET', '/api/metrics-test/{author}')
+    status, _, _ = asyncio.run(asgi_request(app, 'GET', '/api/metrics-test/someone'))
+    
+    assert status == 200
+    assert sample('GET', '/api/metrics-test/{author}') == before + 1
+    assert sample('GET', '/metrics-test/{author}') == 0
+
+
+def test_unmatched_paths_share_one_label():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+    
+    before = sample('GET', 'unmatched', '404')
+    status, _, _ = asyncio.run(asgi_request(app, 'GET', '/wp-admin/setup.php'))
+    
+    assert status == 404
+    assert sample('GET', 'unmatched', '404') == before + 1
@@ -0,0 +1,150 @@
+"""RequestQueue ordering, dedupe and persistence."""
+
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import AutoReconnect
+from controllers.database import request
+from controllers.database.request import RequestQueue, normalize_track, create_and_save_unique_request
+
+TRACK = '0123456789abcdef012345'
+
+
+def make_queue(bulk_write=None, **options):
+    db = mock.MagicMock()
+    db.requests.bulk_write = bulk_write or mock.AsyncMock()
+    return RequestQueue(db, mock.AsyncMock(), **options)
+
+
+def song(number):
+    return f'https://open.spotify.com/track/{number:022d}'
+
+
+@pytest.mark.parametrize('url', [
+    f'spotify:track:{TRACK}',
+    f'https://open.spotify.com/track/{TRACK}?si=abcdef',
+    f'https://open.spotify.com/intl-de/track/{TRACK}',
+    f'open.spotify.com/track/{TRACK}',
+    TRACK,
+])
+def test_spotify_links_normalize_to_the_track_id(url):
+    assert normalize_track(url) == f'spotify:{TRACK}'
+
+
+@pytest.mark.parametrize('url', [
+    'https://youtu.be/dQw4w9WgXcQ?t=42',
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RD',
+    'https://m.youtube.com/watch?v=dQw4w9WgXcQ',
+    'https://music.youtube.com/watch?v=dQw4w9WgXcQ',
+])
+def test_youtube_links_normalize_to_the_video_id(url):
+    assert normalize_track(url) == 'youtube:dQw4w9WgXcQ'
+
+
+def test_other_links_drop_query_and_fragment():
+    assert normalize_track('https://www.SoundCloud.com/artist/song/?ref=x#t=1') == 'soundcloud.com/artist/song'
+
+
+def test_priority_first_then_arrival_order():
+    queue = make_queue()
+    queue.add(song(1), 'a')
+    queue.add(song(2), 'b', role='vip')
+    queue.add(song(3), 'c', role='Moderator')
+    queue.add(song(4), 'd')
+    queue.add(song(5), 'e', role='sub')
+    
+    assert [entry['author'] for entry in queue.peek(10)] == ['c', 'b', 'e', 'a', 'd']
+    assert [queue.pop()['author'] for _ in range(5)] == ['c', 'b', 'e', 'a', 'd']
+    assert queue.pop() is None
+
+
+def test_removed_entries_are_skipped_and_compacted():
+    queue = make_queue()
+    for number in range(200):
+        queue.add(song(number), f'viewer{number}')
+    
+    assert queue.remove(song(0))['author'] == 'viewer0'
+    assert queue.remove(f'spotify:{1:022d}')['author'] == 'viewer1'
+    assert queue.remove(song(0)) is None
+    # The removed tuples are still in the heap, but never come out of it
+    assert len(queue._heap) == 200
+    assert queue.pop()['author'] == 'viewer2'
+    
+    for number in range(3, 150):
+        queue.remove(song(number))
+    assert len(queue) == 50
+    assert len(queue._heap) <= 2 * len(queue) + 64
+    assert [entry['author'] for entry in queue.peek(2)] == ['viewer150', 'viewer151']
+
+
+def test_removed_track_can_be_requested_again():
+    queue = make_queue()
+    first = queue.add(song(1), 'a')
+    queue.remove(song(1))
+    second = queue.add(song(1), 'b')
+    
+    assert second['seq'] > first['seq']
+    assert queue.pop()['author'] == 'b'
+    assert queue.pop() is None
+
+
+def make_request(queue):
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(request_queue=queue)))
+
+
+def test_same_track_shared_differently_gets_409():
+    request = make_request(make_queue())
+    asyncio.run(create_and_save_unique_request(request, {'url': f'spotify:track:{TRACK}', 'author': 'a'}))
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(create_and_save_unique_request(request, {'url': f'https://open.spotify.com/track/{TRACK}?si=x', 'author': 'b'}))
+    assert error.value.status_code == 409
+
+
+def test_full_queue_gets_503_with_retry_after():
+    request = make_request(make_queue(max_size=2))
+    for number in range(2):
+        asyncio.run(create_and_save_unique_request(request, {'url': song(number), 'author': 'a'}))
+    
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(create_and_save_unique_request(request, {'url': song(3), 'author': 'a'}))
+    assert error.value.status_code == 503
+    assert 'Retry-After' in error.value.headers
+
+
+def test_routes_answer_503_without_a_queue():
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(request.get_request_queue(make_request(None), limit=10))
+    assert error.value.status_code == 503
+
+
+def test_failed_write_is_kept_and_not_announced():
+    bulk_write = mock.AsyncMock(side_effect=[AutoReconnect('failover'), None])
+    queue = make_queue(bulk_write)
+    queue.add(f'spotify:track:{TRACK}', 'viewer')
+    
+    assert asyncio.run(queue._flush()) is False
+    queue.sio.emit.assert_not_awaited()
+    
+    assert asyncio.run(queue._flush()) is True
+    assert len(bulk_write.await_args_list[1].args[0]) == 1
+    queue.sio.emit.assert_awaited_once()
+
+
+def test_flusher_backs_off_while_writes_fail(monkeypatch):
+    monkeypatch.setattr(request, 'MAX_RETRY_DELAY', 0.04)
+    bulk_write = mock.AsyncMock(side_effect=AutoReconnect('down'))
+    queue = make_queue(bulk_write, flush_interval=0.005)
+    
+    async def run():
+        queue.add(f'spotify:track:{TRACK}', 'viewer')
+        queue.start()
+        await asyncio.sleep(0.3)
+        queue._task.cancel()
+    asyncio.run(run())
+    
+    # Every 5ms without the backoff, about 60 attempts
+    assert 3 <= bulk_write.await_count <= 15
+    queue.sio.emit.assert_not_awaited()
@@ -0,0 +1,48 @@
+"""Settings come from the environment and .env, with empty values treated as unset."""
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+from settings import Settings
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER = ROOT / 'server'
+
+# Modules that read settings into constants at import time
+MODULES = [
+    'controllers.upstream', 'controllers.tokens', 'controllers.metrics', 'controllers.pubsub',
+    'controllers.twitch', 'controllers.database.writebehind', 'controllers.database.request',
+    'controllers.database.dedupe', 'daemons.current_spotify_track', 'daemons.follower_sync',
+]
+
+
+def example_keys():
+    lines = (ROOT / '.env.example').read_text().splitlines()
+    return [line.split('=', 1)[0].strip() for line in lines if '=' in line and not line.lstrip().startswith('#')]
+
+
+def run_python(code, cwd, env):
+    return subprocess.run(
+        [sys.executable, '-c', code], cwd=cwd, env={**os.environ, **env, 'PYTHONPATH': str(SERVER)},
+        capture_output=True, text=True
+    )
+
+
+def test_empty_values_fall_back_to_defaults(monkeypatch):
+    for key in example_keys():
+        monkeypatch.setenv(key, '')
+    assert Settings.from_env() == Settings()
+
+
+def test_modules_import_with_every_example_key_exported_empty(tmp_path):
+    env = {key: '' for key in example_keys()}
+    result = run_python('; '.join(f'import {module}' for module in MODULES), tmp_path, env)
+    assert result.returncode == 0, result.stderr
+
+
+def test_dotenv_values_reach_import_time_constants(tmp_path):
+    (tmp_path / '.env').write_text('MESSAGE_WRITE_BATCH_SIZE=7\n')
+    result = run_python('from controllers.database import writebehind; print(writebehind.BATCH_SIZE)', tmp_path, {})
+    assert result.stdout.strip() == '7', result.stderr
@@ -0,0 +1,42 @@
+"""SpotifyPoller.latest while Spotify is failing."""
+
+import time
+import asyncio
+from unittest import mock
+import pytest
+from daemons.current_spotify_track import SpotifyPoller
+
+
+def test_latest_fails_fast_after_a_failed_poll():
+    poller = SpotifyPoller(mock.AsyncMock())
+    poller.poll = mock.AsyncMock(side_effect=RuntimeError('spotify answered 502'))
+    
+    async def run():
+        poller.start()
+        try:
+            started = time.perf_counter()
+            with pytest.raises(RuntimeError, match='502'):
+                await poller.latest(timeout=5)
+            # The second request must not wait on the poller again
+            with pytest.raises(RuntimeError):
+                await poller.latest(timeout=5)
+            return time.perf_counter() - started
+        finally:
+            await poller.stop()
+    
+    assert asyncio.run(run()) < 1
+
+
+def test_latest_returns_the_last_payload():
+    poller = SpotifyPoller(mock.AsyncMock())
+    poller.poll = mock.AsyncMock(return_value=None)
+    
+    async def run():
+        poller.start()
+        try:
+            return await poller.latest(timeout=5), await poller.current()
+        finally:
+            await poller.stop()
+    
+    data, snapshot = asyncio.run(run())
+    assert data is None and snapshot['playing'] is False
@@ -0,0 +1,126 @@
+"""TokenManager refreshes and API token validation."""
+
+import json
+import asyncio
+import pytest
+from fastapi import FastAPI, Depends
+from settings import Settings, get_settings
+from controllers.tokens import TokenManager, validate_token
+from conftest import asgi_request
+
+
+class FakeTokenEndpoint:
+    """Counts calls and answers like a slow token endpoint."""
+
+    def __init__(self, expires_in=3600, delay=0.05):
+        self.calls = 0
+        self.expires_in = expires_in
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {'access_token': f'token{self.calls}', 'expires_in': self.expires_in}
+
+
+def test_concurrent_gets_share_one_refresh():
+    endpoint = FakeTokenEndpoint()
+    tokens = TokenManager('test', endpoint)
+    
+    async def run():
+        try:
+            results = await asyncio.gather(*(tokens.get() for _ in range(20)))
+            # Cached afterwards, no more calls
+            results.append(await tokens.get())
+            return results
+        finally:
+            tokens.close()
+    
+    results = asyncio.run(run())
+    assert endpoint.calls == 1
+    assert {result['access_token'] for result in results} == {'token1'}
+
+
+def test_refresh_is_scheduled_before_expiry():
+    tokens = TokenManager('test', FakeTokenEndpoint(expires_in=3600), margin=60)
+    
+    async def run():
+        try:
+            await tokens.get()
+            return tokens._timer.when() - asyncio.get_running_loop().time()
+        finally:
+            tokens.close()
+    
+    assert 3539 <= asyncio.run(run()) <= 3540
+
+
+def test_background_refresh_replaces_the_token():
+    # expires_in - margin is below the 1s floor, so the refresh fires after 1s
+    endpoint = FakeTokenEndpoint(expires_in=30, delay=0)
+    tokens = TokenManager('test', endpoint, margin=60)
+    
+    async def run():
+        try:
+            await tokens.get()
+            await asyncio.sleep(1.2)
+            return tokens._data
+        finally:
+            tokens.close()
+    
+    assert asyncio.run(run())['access_token'] == 'token2'
+    assert endpoint.calls == 2
+
+
+def test_error_payload_is_not_cached():
+    calls = []
+    
+    async def failing():
+        calls.append(1)
+        return {'error': 'invalid_grant'}
+    
+    tokens = TokenManager('test', failing)
+    assert asyncio.run(tokens.get()) == {'error': 'invalid_grant'}
+    assert asyncio.run(tokens.get()) == {'error': 'invalid_grant'}
+    assert len(calls) == 2
+
+
+def make_app():
+    app = FastAPI()
+    app.dependency_overrides[get_settings] = lambda: Settings(api_token='secret')
+    
+    @app.api_route('/protected', methods=['GET', 'POST'], dependencies=[Depends(validate_token)])
+    async def protected():
+        return {'ok': True}
+    return app
+
+
+def call(method, headers=None, query=b'', body=None):
+    payload = json.dumps(body).encode() if body is not None else b''
+    headers = dict(headers or {}, **({'content-type': 'application/json'} if body is not None else {}))
+    status, _, _ = asyncio.run(asgi_request(make_app(), method, '/protected', headers, query, payload))
+    return status
+
+
+@pytest.mark.parametrize('method, headers, query, body, expected', [
+    ('GET', {'Authorization': 'Bearer secret'}, b'', None, 200),
+    ('GET', {'X-Scrambled-Token': 'secret'}, b'', None, 200),
+    ('GET', {}, b'token=secret', None, 200),
+    ('POST', {}, b'', {'token': 'secret'}, 200),
+    ('GET', {}, b'', None, 403),
+    ('GET', {'Authorization': 'Bearer wrong'}, b'', None, 403),
+    # A header token, right or wrong, wins over the query and the body
+    ('GET', {'Authorization': 'Bearer wrong'}, b'token=secret', None, 403),
+    ('GET', {'X-Scrambled-Token': 'wrong'}, b'token=secret', None, 403),
+    ('POST', {'Authorization': 'Bearer wrong'}, b'', {'token': 'secret'}, 403),
+    # The query wins over the body
+    ('POST', {}, b'token=wrong', {'token': 'secret'}, 403),
+])
+def test_token_precedence(method, headers, query, body, expected):
+    assert call(method, headers, query, body) == expected
+
+
+def test_unset_api_token_rejects_everything():
+    app = make_app()
+    app.dependency_overrides[get_settings] = lambda: Settings(api_token=None)
+    status, _, _ = asyncio.run(asgi_request(app, 'GET', '/protected', {'Authorization': 'Bearer '}))
+    assert status == 403
@@ -0,0 +1,117 @@
+"""Upstream rate limiting, retries and GET coalescing, against a fake session."""
+
+import time
+import asyncio
+from multidict import CIMultiDict
+from controllers import upstream
+from controllers.upstream import Upstream, TokenBucket
+
+
+class FakeResponse:
+    """Just enough of an aiohttp response for Upstream._send."""
+
+    def __init__(self, status, headers=None, body=b'{}', delay=0.0):
+        self.status = status
+        self.headers = CIMultiDict(headers or {})
+        self.body = body
+        self.delay = delay
+
+    async def __aenter__(self):
+        await asyncio.sleep(self.delay)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    """Answers from a list of responses (the last one repeats) and records each call."""
+
+    def __init__(self, *responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = []
+
+    def request(self, method, url, headers=None, data=None):
+        self.calls.append((method, url, time.monotonic()))
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        return FakeResponse(response.status, response.headers, response.body, self.delay)
+
+
+def use_session(monkeypatch, session):
+    monkeypatch.setattr(upstream, 'get_session', lambda: session)
+    return session
+
+
+def test_429_waits_out_retry_after_and_retries(monkeypatch):
+    session = use_session(monkeypatch, FakeSession(
+        FakeResponse(429, {'Retry-After': '0.2'}),
+        FakeResponse(200, body=b'{"ok": true}')
+    ))
+    client = Upstream('test', rate=100, capacity=10)
+    
+    result = asyncio.run(client.get('https://api.test/thing'))
+    
+    assert result.status == 200 and result.data == {'ok': True}
+    assert len(session.calls) == 2
+    assert session.calls[1][2] - session.calls[0][2] >= 0.19
+    assert client.stats()['throttled'] == 1
+
+
+def test_429_is_returned_once_retries_run_out(monkeypatch):
+    session = use_session(monkeypatch, FakeSession(FakeResponse(429, {'Retry-After': '0'})))
+    client = Upstream('test', rate=100, capacity=10, max_retries=2)
+    
+    result = asyncio.run(client.get('https://api.test/thing'))
+    
+    assert result.status == 429
+    assert len(session.calls) == 3
+
+
+def test_ratelimit_remaining_zero_pauses_until_reset(monkeypatch):
+    reset = time.time() + 0.3
+    session = use_session(monkeypatch, FakeSession(
+        FakeResponse(200, {'Ratelimit-Remaining': '0', 'Ratelimit-Reset': str(reset)}),
+        FakeResponse(200, {'Ratelimit-Remaining': '799'})
+    ))
+    client = Upstream('test', rate=100, capacity=10)
+    
+    async def run():
+        await client.get('https://api.test/a')
+        await client.get('https://api.test/b')
+    asyncio.run(run())
+    
+    assert session.calls[1][2] - session.calls[0][2] >= 0.25
+
+
+def test_ratelimit_remaining_caps_the_burst():
+    bucket = TokenBucket(rate=10, capacity=20)
+    bucket.limit(2)
+    
+    async def run():
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.monotonic() - started
+    
+    # Two tokens left, the third waits for one to refill at 10/s
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_identical_gets_share_one_request(monkeypatch):
+    session = use_session(monkeypatch, FakeSession(FakeResponse(200, body=b'{"n": 1}'), delay=0.05))
+    client = Upstream('test', rate=100, capacity=50)
+    
+    async def run():
+        same = [client.get('https://api.test/a', headers={'Authorization': 'Bearer x'}) for _ in range(10)]
+        other = [client.get('https://api.test/a', headers={'Authorization': 'Bearer y'}), client.post('https://api.test/a')]
+        return await asyncio.gather(*same, *other)
+    results = asyncio.run(run())
+    
+    assert all(result.data == {'n': 1} for result in results)
+    # One for the shared GET, one for the other token, POSTs are never shared
+    assert len(session.calls) == 3
+    assert client.stats()['coalesced'] == 9
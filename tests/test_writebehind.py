@@ -0,0 +1,66 @@
+"""MessageWriteBuffer flushing and shutdown."""
+
+import asyncio
+from unittest import mock
+from pymongo.errors import AutoReconnect
+from controllers.database import writebehind
+from controllers.database.writebehind import MessageWriteBuffer
+
+
+def make_db(insert_many):
+    db = mock.MagicMock()
+    db.messages.insert_many = insert_many
+    db.message_stats.bulk_write = mock.AsyncMock()
+    return db
+
+
+def message(text):
+    return {'hash': text, 'author': 'a', 'source': 's', 'content': text}
+
+
+def test_flush_retries_a_failed_write(monkeypatch):
+    monkeypatch.setattr(writebehind, 'FLUSH_RETRY_DELAY', 0)
+    insert_many = mock.AsyncMock(side_effect=[AutoReconnect('failover'), None])
+    on_written = mock.AsyncMock()
+    buffer = MessageWriteBuffer(make_db(insert_many), on_written=on_written)
+    
+    async def run():
+        buffer.start()
+        await buffer.submit(message('one'))
+        await buffer.stop()
+    asyncio.run(run())
+    
+    assert insert_many.await_count == 2
+    assert buffer.written == 1 and buffer.failed == 0
+    on_written.assert_awaited_once()
+
+
+def test_failing_hook_keeps_the_flusher_running():
+    insert_many = mock.AsyncMock()
+    on_written = mock.AsyncMock(side_effect=RuntimeError('socket.io down'))
+    buffer = MessageWriteBuffer(make_db(insert_many), flush_interval=0.01, on_written=on_written)
+    
+    async def run():
+        buffer.start()
+        await buffer.submit(message('one'))
+        await asyncio.sleep(0.05)
+        await buffer.submit(message('two'))
+        await buffer.stop()
+    asyncio.run(run())
+    
+    assert buffer.written == 2
+
+
+def test_stop_does_not_hang_when_the_flusher_died():
+    insert_many = mock.AsyncMock()
+    buffer = MessageWriteBuffer(make_db(insert_many), queue_size=1)
+    
+    async def run():
+        buffer._task = asyncio.create_task(asyncio.sleep(0))
+        await buffer._task
+        buffer.queue.put_nowait(message('stranded'))
+        await asyncio.wait_for(buffer.stop(), 1)
+    asyncio.run(run())
+    
+    # The message the dead flusher left in the full queue is still written
+    assert buffer.written == 1